@@ -0,0 +1,191 @@
+import os
+import sys
+import threading
+from array import array
+from collections import Counter
+from datetime import date
+from controler import SessionLocal
+from eventos import broadcaster
+from models.models import Employer
+
+# Snapshot colunar do quadro de pessoal para perguntas analíticas
+# (contagens por sector/status, faixas etárias) sem criar objetos ORM.
+# As colunas de texto são codificadas por dicionário e as datas guardadas
+# como ordinais em array('l'). A sequência do broadcaster de eventos serve de
+# contador de alterações: só os funcionários tocados desde a última leitura
+# são recarregados. Escritas feitas fora da API exigem recarregar().
+
+ANALITICA_SNAPSHOT = os.getenv("ANALITICA_SNAPSHOT", "1") == "1"
+
+COLUNAS_TEXTO = ["sector", "reparticao", "provincia", "status", "sexo"]
+COLUNAS_DATA = ["nascimento", "inicio_funcoes"]
+SEM_DATA = -1
+
+
+class Dicionario:
+    """Codifica valores de texto em inteiros (None -> -1)"""
+
+    def __init__(self):
+        self.valores = []
+        self.codigos = {}
+
+    def codificar(self, valor):
+        if valor is None:
+            return -1
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = len(self.valores)
+            self.codigos[valor] = codigo
+            self.valores.append(valor)
+        return codigo
+
+    def decodificar(self, codigo):
+        return None if codigo < 0 else self.valores[codigo]
+
+
+class Snapshot:
+    def __init__(self, sessao=SessionLocal):
+        self.sessao = sessao  # fábrica de sessões (outra base em benchmark_analitica.py)
+        self.lock = threading.Lock()
+        self.sequencia = None
+        self.limpar()
+
+    def limpar(self):
+        self.ids = array("l")
+        self.posicoes = {}
+        self.texto = {coluna: array("l") for coluna in COLUNAS_TEXTO}
+        self.dicionarios = {coluna: Dicionario() for coluna in COLUNAS_TEXTO}
+        self.datas = {coluna: array("l") for coluna in COLUNAS_DATA}
+        self.ano_inicio = array("l")
+
+    def gravar(self, linha):
+        """Insere ou substitui a linha do funcionário nas colunas"""
+        posicao = self.posicoes.get(linha.id)
+        if posicao is None:
+            posicao = len(self.ids)
+            self.posicoes[linha.id] = posicao
+            self.ids.append(linha.id)
+            for coluna in self.texto.values():
+                coluna.append(-1)
+            for coluna in self.datas.values():
+                coluna.append(SEM_DATA)
+            self.ano_inicio.append(0)
+        for coluna in COLUNAS_TEXTO:
+            self.texto[coluna][posicao] = self.dicionarios[coluna].codificar(getattr(linha, coluna))
+        for coluna in COLUNAS_DATA:
+            valor = getattr(linha, coluna)
+            self.datas[coluna][posicao] = valor.toordinal() if valor else SEM_DATA
+        self.ano_inicio[posicao] = linha.ano_inicio or 0
+
+    def carregar(self, ids=None):
+        colunas = [getattr(Employer, coluna) for coluna in ["id", "ano_inicio"] + COLUNAS_TEXTO + COLUNAS_DATA]
+        with self.sessao() as db:
+            # só as colunas necessárias, sem instanciar Employer
+            query = db.query(*colunas)
+            if ids is not None:
+                query = query.filter(Employer.id.in_(ids))
+            for linha in query.yield_per(1000):
+                self.gravar(linha)
+
+    def recarregar(self):
+        with self.lock:
+            self.limpar()
+            self.sequencia = broadcaster.sequencia
+            self.carregar()
+
+    def atualizar(self):
+        """Aplica as alterações publicadas desde a última leitura"""
+        with self.lock:
+            atual = broadcaster.sequencia
+            if self.sequencia == atual:
+                return
+            eventos = [evento for evento in list(broadcaster.historico) if evento["seq"] > (self.sequencia or 0)]
+            if (self.sequencia is None or not eventos or eventos[0]["seq"] != self.sequencia + 1
+                    or any(evento["tipo"] == "employer.arquivado" for evento in eventos)):
+                # primeira leitura, histórico já sem os eventos em falta
+                # ou funcionários movidos para o arquivo
+                self.limpar()
+                self.sequencia = atual
+                self.carregar()
+                return
+            ids = set()
+            for evento in eventos:
+                dados = evento["dados"]
+                funcionario_id = dados.get("id", dados.get("funcionario_id"))
+                if funcionario_id is not None:
+                    ids.add(int(funcionario_id))
+            self.sequencia = eventos[-1]["seq"]
+            if ids:
+                self.carregar(ids)
+
+    def indices(self, filtros=None):
+        """Posições que satisfazem os filtros de igualdade (valor ou lista)"""
+        selecionadas = None
+        for coluna, valor in (filtros or {}).items():
+            if coluna not in self.texto:
+                raise ValueError(f"Coluna não permitida no filtro: {coluna}")
+            valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+            codigos = {self.dicionarios[coluna].codigos[v] for v in valores if v in self.dicionarios[coluna].codigos}
+            codificada = self.texto[coluna]
+            candidatas = range(len(codificada)) if selecionadas is None else selecionadas
+            selecionadas = [i for i in candidatas if codificada[i] in codigos]
+        return range(len(self.ids)) if selecionadas is None else selecionadas
+
+    def contar(self, coluna, filtros=None):
+        """Contagem agrupada por uma coluna de texto"""
+        self.atualizar()
+        if coluna not in self.texto:
+            raise ValueError(f"Coluna não permitida no agrupamento: {coluna}")
+        with self.lock:
+            codificada = self.texto[coluna]
+            if filtros:
+                contagem = Counter(codificada[i] for i in self.indices(filtros))
+            else:
+                contagem = Counter(codificada)
+            dicionario = self.dicionarios[coluna]
+            return {dicionario.decodificar(codigo): total for codigo, total in contagem.items()}
+
+    def faixasEtarias(self, largura=10, filtros=None, hoje=None):
+        """Distribuição por faixas de idade (ex: "30-39")"""
+        self.atualizar()
+        hoje = (hoje or date.today()).toordinal()
+        with self.lock:
+            nascimento = self.datas["nascimento"]
+            contagem = Counter()
+            for i in self.indices(filtros):
+                if nascimento[i] == SEM_DATA:
+                    continue
+                inicio = int((hoje - nascimento[i]) / 365.2425) // largura * largura
+                contagem[inicio] += 1
+            return {f"{inicio}-{inicio + largura - 1}": contagem[inicio] for inicio in sorted(contagem)}
+
+    def filtrar(self, filtros=None):
+        """Ids dos funcionários que satisfazem os filtros"""
+        self.atualizar()
+        with self.lock:
+            return [self.ids[i] for i in self.indices(filtros)]
+
+    def memoria(self):
+        """Bytes ocupados pelas colunas, no total e por funcionário"""
+        self.atualizar()
+        with self.lock:
+            arrays = [self.ids, self.ano_inicio] + list(self.texto.values()) + list(self.datas.values())
+            colunas = sum(sys.getsizeof(coluna) for coluna in arrays)
+            dicionarios = sum(
+                sys.getsizeof(d.valores) + sys.getsizeof(d.codigos) + sum(sys.getsizeof(v) for v in d.valores)
+                for d in self.dicionarios.values()
+            )
+            posicoes = sys.getsizeof(self.posicoes)
+            total = colunas + dicionarios + posicoes
+            funcionarios = len(self.ids)
+            return {
+                "funcionarios": funcionarios,
+                "bytes_colunas": colunas,
+                "bytes_dicionarios": dicionarios,
+                "bytes_indice": posicoes,
+                "bytes_total": total,
+                "bytes_por_funcionario": round(total / funcionarios, 1) if funcionarios else 0,
+            }
+
+
+snapshot = Snapshot()
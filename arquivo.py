@@ -0,0 +1,111 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text, bindparam, DateTime
+from starlette.concurrency import run_in_threadpool
+from controler import engine, SessionLocal
+from models.models import EmployerHistorico
+from eventos import publicar
+
+# Arquivo de funcionários inativos há muito tempo (Removido, FALECIDO,
+# APOSENTADO). O funcionário e as suas linhas de eventos passam para tabelas
+# <tabela>_arquivo na mesma base; as vistas <tabela>_historico juntam as duas
+# partes para consultas históricas. Assim as listas do quadro ativo dependem
+# só do número de funcionários atuais.
+
+ARQUIVAVEIS = ["Removido", "FALECIDO", "APOSENTADO"]
+ARQUIVO_ANOS = float(os.getenv("ARQUIVO_ANOS", "5"))  # anos desde a mudança de status
+ARQUIVO_INTERVALO = float(os.getenv("ARQUIVO_INTERVALO_HORAS", "24"))  # 0 desativa o agendamento
+TABELAS_EVENTOS = ["ferias", "transferencias", "reformas", "falecimentos", "suspensos"]
+LOTE = 500
+ESTADOS = ", ".join(f"'{status}'" for status in ARQUIVAVEIS)  # constantes, seguras em SQL
+
+
+def colunas(conn, tabela):
+    return [coluna["name"] for coluna in inspect(conn).get_columns(tabela)]
+
+
+def prepararArquivo():
+    """Cria (ou completa) as tabelas de arquivo e recria as vistas de histórico"""
+    with engine.begin() as conn:
+        for tabela in ["employers"] + TABELAS_EVENTOS:
+            arquivo = f"{tabela}_arquivo"
+            if not inspect(conn).has_table(arquivo):
+                conn.execute(text(f"CREATE TABLE {arquivo} AS SELECT * FROM {tabela} WHERE 0"))
+                conn.execute(text(f"ALTER TABLE {arquivo} ADD COLUMN arquivado_em DATETIME"))
+                chave = "id" if tabela == "employers" else "funcionario_id"
+                conn.execute(text(f"CREATE INDEX ix_{arquivo}_{chave} ON {arquivo} ({chave})"))
+            # colunas adicionadas depois à tabela original
+            existentes = set(colunas(conn, arquivo))
+            for coluna in inspect(conn).get_columns(tabela):
+                if coluna["name"] not in existentes:
+                    tipo = coluna["type"].compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {arquivo} ADD COLUMN {coluna['name']} {tipo}"))
+            # ids já arquivados não podem voltar a ser atribuídos a linhas novas
+            maximo = conn.execute(text(f"SELECT MAX(id) FROM {arquivo}")).scalar()
+            sequencia = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = :tabela"), {"tabela": tabela}).scalar()
+            if maximo is not None and sequencia is None:
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:tabela, :seq)"), {"tabela": tabela, "seq": maximo})
+            elif maximo is not None and sequencia < maximo:
+                conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :tabela"), {"tabela": tabela, "seq": maximo})
+            lista = ", ".join(colunas(conn, tabela))
+            conn.execute(text(f"DROP VIEW IF EXISTS {tabela}_historico"))
+            conn.execute(text(
+                f"CREATE VIEW {tabela}_historico AS "
+                f"SELECT {lista}, NULL AS arquivado_em FROM {tabela} "
+                f"UNION ALL SELECT {lista}, arquivado_em FROM {arquivo}"
+            ))
+        # inativos antigos sem data: o prazo começa a contar agora
+        conn.execute(
+            text(f"UPDATE employers SET status_alterado = :agora WHERE status_alterado IS NULL AND status IN ({ESTADOS})")
+            .bindparams(bindparam("agora", type_=DateTime)),
+            {"agora": datetime.utcnow()},
+        )
+
+
+def arquivar(anos=ARQUIVO_ANOS, agora=None):
+    """Move para o arquivo os inativos há mais de `anos`; devolve quantos foram movidos"""
+    agora = agora or datetime.utcnow()
+    limite = agora - timedelta(days=365.25 * anos)
+    total = 0
+    with engine.begin() as conn:
+        ids = [linha[0] for linha in conn.execute(
+            text(f"SELECT id FROM employers WHERE status IN ({ESTADOS}) AND status_alterado < :limite")
+            .bindparams(bindparam("limite", type_=DateTime)),
+            {"limite": limite},
+        )]
+        for inicio in range(0, len(ids), LOTE):
+            lote = ids[inicio:inicio + LOTE]
+            marcadores = ", ".join(str(int(id)) for id in lote)
+            for tabela in TABELAS_EVENTOS + ["employers"]:
+                chave = "id" if tabela == "employers" else "funcionario_id"
+                lista = ", ".join(colunas(conn, tabela))
+                conn.execute(
+                    text(f"INSERT INTO {tabela}_arquivo ({lista}, arquivado_em) "
+                         f"SELECT {lista}, :agora FROM {tabela} WHERE {chave} IN ({marcadores})")
+                    .bindparams(bindparam("agora", type_=DateTime)),
+                    {"agora": agora},
+                )
+                conn.execute(text(f"DELETE FROM {tabela} WHERE {chave} IN ({marcadores})"))
+            total += len(lote)
+    if total:
+        publicar("employer.arquivado", {"total": total})
+    return total
+
+
+def getHistorico(id):
+    """Procura o funcionário no quadro atual e no arquivo"""
+    with SessionLocal() as db:
+        # classe mapeada sobre a vista: as datas voltam como datetime, como em getById
+        return db.query(EmployerHistorico).filter_by(id=id).first()
+
+
+async def cicloArquivo():
+    """Tarefa de fundo que corre o arquivo a cada ARQUIVO_INTERVALO horas"""
+    while True:
+        await asyncio.sleep(ARQUIVO_INTERVALO * 3600)
+        try:
+            total = await run_in_threadpool(arquivar)
+            print(f"Arquivo: {total} funcionários movidos")
+        except Exception as e:
+            print(f"Erro no arquivo: {e}")
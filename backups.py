@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from controler import engine, replica_engine, REPLICA_PATH
+
+# Cópias da base com a API de backup do SQLite (online, sem bloquear as
+# escritas durante toda a cópia): snapshots de ponto no tempo em
+# database/snapshots e a réplica só de leitura usada por controler.get_replica_db.
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "database/snapshots")
+SNAPSHOT_MANTER = int(os.getenv("SNAPSHOT_MANTER", "7"))  # e nunca os dos últimos SNAPSHOT_MANTER intervalos
+SNAPSHOT_INTERVALO = float(os.getenv("SNAPSHOT_INTERVALO_HORAS", "24"))  # 0 desativa
+REPLICA_INTERVALO = float(os.getenv("REPLICA_INTERVALO", "300"))  # segundos, 0 desativa
+PAGINAS_POR_PASSO = 256  # páginas copiadas antes de libertar a base para as escritas
+
+lock = threading.Lock()
+
+
+def copiar(destino):
+    """Copia a base principal para `destino` de forma atómica"""
+    temporario = f"{destino}.tmp"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    origem = engine.raw_connection()
+    try:
+        copia = sqlite3.connect(temporario)
+        try:
+            origem.driver_connection.backup(copia, pages=PAGINAS_POR_PASSO)
+        finally:
+            copia.close()
+    finally:
+        origem.close()
+    os.replace(temporario, destino)
+
+
+def atualizarReplica():
+    with lock:
+        copiar(REPLICA_PATH)
+        # ligações antigas continuam a ler o ficheiro anterior até serem fechadas
+        replica_engine.dispose()
+    return datetime.utcfromtimestamp(os.path.getmtime(REPLICA_PATH))
+
+
+def listarSnapshots():
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    snapshots = []
+    for nome in sorted(os.listdir(SNAPSHOT_DIR), reverse=True):
+        if not nome.endswith(".db"):
+            continue
+        caminho = os.path.join(SNAPSHOT_DIR, nome)
+        snapshots.append({
+            "nome": nome,
+            "bytes": os.path.getsize(caminho),
+            "criado": datetime.utcfromtimestamp(os.path.getmtime(caminho)).isoformat(),
+        })
+    return snapshots
+
+
+def idadeSnapshot():
+    """Segundos desde o snapshot mais recente, ou None se não houver nenhum"""
+    snapshots = listarSnapshots()
+    if not snapshots:
+        return None
+    return time.time() - max(os.path.getmtime(os.path.join(SNAPSHOT_DIR, snapshot["nome"])) for snapshot in snapshots)
+
+
+def fazerSnapshot():
+    """
+    Cria um snapshot datado. Apaga os que excedem SNAPSHOT_MANTER, mas só se
+    forem mais antigos que SNAPSHOT_MANTER intervalos: snapshots manuais
+    seguidos não levam os diários.
+    """
+    with lock:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # microssegundos: dois snapshots no mesmo segundo não se sobrepõem
+        nome = f"hospital-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.db"
+        copiar(os.path.join(SNAPSHOT_DIR, nome))
+        limite = time.time() - SNAPSHOT_MANTER * SNAPSHOT_INTERVALO * 3600
+        for antigo in listarSnapshots()[SNAPSHOT_MANTER:]:
+            caminho = os.path.join(SNAPSHOT_DIR, antigo["nome"])
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+    return nome
+
+
+async def ciclo(intervalo, tarefa, nome):
+    while True:
+        try:
+            await run_in_threadpool(tarefa)
+        except Exception as e:
+            print(f"Erro em {nome}: {e}")
+        await asyncio.sleep(intervalo)
+
+
+async def cicloSnapshots(intervalo):
+    """
+    Como ciclo, mas conta o intervalo a partir do último snapshot em disco:
+    reinícios do serviço (plano gratuito do Render) não criam snapshots extra.
+    """
+    idade = idadeSnapshot()
+    if idade is not None and idade < intervalo:
+        await asyncio.sleep(intervalo - idade)
+    await ciclo(intervalo, fazerSnapshot, "snapshot")
+
+
+def agendar():
+    """Inicia as tarefas de fundo (chamado no arranque da aplicação)"""
+    if REPLICA_INTERVALO > 0:
+        asyncio.create_task(ciclo(REPLICA_INTERVALO, atualizarReplica, "réplica"))
+    if SNAPSHOT_INTERVALO > 0:
+        asyncio.create_task(cicloSnapshots(SNAPSHOT_INTERVALO * 3600))
@@ -0,0 +1,114 @@
+"""
+Mede o snapshot colunar de analitica.py: bytes por funcionário e tempos de
+contar, faixasEtarias e filtrar, comparados com as mesmas perguntas em SQL.
+
+    python benchmark_analitica.py --funcionarios 20000
+
+Corre numa base SQLite temporária; database/hospital.db não é tocada.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+from models.models import Base, Employer
+from analitica import Snapshot
+
+SECTORES = ["Maternidade", "Laboratório", "Psiquiatria", "Medicina 1", "Pediatria", "Cirurgia"]
+PROVINCIAS = ["Niassa", "Nampula", "Zambézia", "Tete", "Sofala", "Maputo"]
+STATUS = ["ACTIVO"] * 8 + ["LICENCA", "DISPENSA", "TRANSFERIDO", "APOSENTADO", "Removido"]
+FILTROS = {"status": ["ACTIVO", "LICENCA"], "sexo": "F"}
+HOJE = date(2026, 1, 1)
+
+
+def semear(Sessao, funcionarios, semente=1):
+    """Cria `funcionarios` com sector, província, status, sexo e datas aleatórios"""
+    aleatorio = random.Random(semente)
+    linhas = []
+    for i in range(funcionarios):
+        nascimento = datetime(1960, 1, 1) + timedelta(days=aleatorio.randrange(365 * 45))
+        inicio = nascimento + timedelta(days=365 * 20 + aleatorio.randrange(365 * 15))
+        linhas.append({
+            "nome": f"Funcionario{i}", "apelido": "Teste", "bi": f"BI{i}", "nuit": f"NUIT{i}",
+            "sector": aleatorio.choice(SECTORES), "reparticao": "Clinica",
+            "provincia": aleatorio.choice(PROVINCIAS), "status": aleatorio.choice(STATUS),
+            "sexo": aleatorio.choice("FM"), "nascimento": nascimento,
+            "inicio_funcoes": inicio, "ano_inicio": inicio.year,
+        })
+    with Sessao() as db:
+        db.execute(insert(Employer), linhas)
+        db.commit()
+
+
+def contarSQL(Sessao):
+    with Sessao() as db:
+        return dict(db.query(Employer.sector, func.count()).filter(
+            Employer.status.in_(FILTROS["status"]), Employer.sexo == FILTROS["sexo"]
+        ).group_by(Employer.sector).all())
+
+
+def faixasSQL(Sessao):
+    with Sessao() as db:
+        contagem = Counter()
+        for (nascimento,) in db.query(Employer.nascimento).filter(
+            Employer.status.in_(FILTROS["status"]), Employer.sexo == FILTROS["sexo"], Employer.nascimento.is_not(None)
+        ):
+            contagem[int((HOJE.toordinal() - nascimento.toordinal()) / 365.2425) // 10 * 10] += 1
+        return {f"{inicio}-{inicio + 9}": contagem[inicio] for inicio in sorted(contagem)}
+
+
+def filtrarSQL(Sessao):
+    with Sessao() as db:
+        return [id for (id,) in db.query(Employer.id).filter(
+            Employer.status.in_(FILTROS["status"]), Employer.sexo == FILTROS["sexo"]
+        )]
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, round(min(tempos) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--funcionarios", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = create_engine(f"sqlite:///{os.path.join(pasta, 'benchmark.db')}")
+        Base.metadata.create_all(bind=engine)
+        Sessao = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        semear(Sessao, args.funcionarios)
+
+        snapshot = Snapshot(Sessao)
+        _, carga = medir(snapshot.recarregar, 1)
+        memoria = snapshot.memoria()
+        print(f"{memoria['funcionarios']} funcionários carregados em {carga} ms")
+        print(f"{memoria['bytes_total']} bytes ({memoria['bytes_por_funcionario']} por funcionário): "
+              f"colunas {memoria['bytes_colunas']}, dicionários {memoria['bytes_dicionarios']}, índice {memoria['bytes_indice']}")
+        print(f"filtros {FILTROS}")
+        print(f"{'pergunta':<16}{'snapshot ms':>13}{'SQL ms':>10}{'iguais':>8}")
+        perguntas = [
+            ("contar", lambda: snapshot.contar("sector", FILTROS), lambda: contarSQL(Sessao)),
+            ("faixasEtarias", lambda: snapshot.faixasEtarias(10, FILTROS, HOJE), lambda: faixasSQL(Sessao)),
+            ("filtrar", lambda: snapshot.filtrar(FILTROS), lambda: filtrarSQL(Sessao)),
+        ]
+        for nome, colunar, sql in perguntas:
+            a, ms_snapshot = medir(colunar, args.repeticoes)
+            b, ms_sql = medir(sql, args.repeticoes)
+            iguais = sorted(a) == sorted(b) if isinstance(a, list) else a == b
+            print(f"{nome:<16}{ms_snapshot:>13}{ms_sql:>10}{'sim' if iguais else 'não':>8}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
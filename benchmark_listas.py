@@ -0,0 +1,115 @@
+"""
+Compara o carregamento das listas de funcionários com histórico longo:
+a consulta antiga (outerjoin + joinedload de férias e transferências)
+contra controler.queryEmployers (selectinload).
+
+    python benchmark_listas.py --funcionarios 100 --eventos 6
+
+Os outerjoin explícitos e os joins do joinedload são independentes, por isso
+a consulta antiga devolve eventos^4 linhas por funcionário. Corre numa base
+SQLite temporária; database/hospital.db não é tocada.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, joinedload
+from models.models import Base, Employer, Feria, Transferencia, STATUS_ACTIVOS
+from controler import queryEmployers
+
+
+def semear(Sessao, funcionarios, eventos):
+    """Cria `funcionarios` ativos, cada um com `eventos` férias e `eventos` transferências"""
+    inicio = datetime(2000, 1, 1)
+    with Sessao() as db:
+        for i in range(funcionarios):
+            funcionario = Employer(
+                nome=f"Funcionario{i}", apelido="Teste", sector="Maternidade",
+                reparticao="Clinica", status="ACTIVO", bi=f"BI{i}", nuit=f"NUIT{i}",
+            )
+            funcionario.ferias = [
+                Feria(data_inicio_ferias=inicio + timedelta(days=30 * j), data_fim_ferias=inicio + timedelta(days=30 * j + 10))
+                for j in range(eventos)
+            ]
+            funcionario.transferencias = [
+                Transferencia(data_transferido=inicio + timedelta(days=30 * j), lugar_transferido="Cuamba")
+                for j in range(eventos)
+            ]
+            db.add(funcionario)
+        db.commit()
+
+
+def consultaAntiga(db):
+    """Forma das listas antes do construtor partilhado (ex: getEmployersRemovido)"""
+    return db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
+        Employer.status.in_(STATUS_ACTIVOS)
+    ).options(joinedload(Employer.ferias), joinedload(Employer.transferencias))
+
+
+def consultaNova(db):
+    return queryEmployers(db, STATUS_ACTIVOS, ("ferias", "transferencias"))
+
+
+def medir(engine, Sessao, consulta, repeticoes):
+    instrucoes = []
+
+    def registar(conn, cursor, statement, parameters, context, executemany):
+        instrucoes.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", registar)
+    try:
+        with Sessao() as db:
+            funcionarios = consulta(db).all()
+            ferias = sum(len(funcionario.ferias) for funcionario in funcionarios)
+    finally:
+        event.remove(engine, "before_cursor_execute", registar)
+
+    # linhas que o SQLite devolve em cada instrução executada
+    linhas = 0
+    conexao = engine.raw_connection()
+    try:
+        for statement, parameters in instrucoes:
+            linhas += len(conexao.cursor().execute(statement, parameters).fetchall())
+    finally:
+        conexao.close()
+
+    tempos = []
+    for _ in range(repeticoes):
+        with Sessao() as db:
+            inicio = time.perf_counter()
+            consulta(db).all()
+            tempos.append(time.perf_counter() - inicio)
+    return {
+        "funcionarios": len(funcionarios),
+        "ferias": ferias,
+        "consultas": len(instrucoes),
+        "linhas": linhas,
+        "ms": round(min(tempos) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--funcionarios", type=int, default=100)
+    parser.add_argument("--eventos", type=int, default=6, help="férias e transferências por funcionário")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        engine = create_engine(f"sqlite:///{os.path.join(pasta, 'benchmark.db')}")
+        Base.metadata.create_all(bind=engine)
+        Sessao = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        semear(Sessao, args.funcionarios, args.eventos)
+
+        print(f"{args.funcionarios} funcionários x {args.eventos} férias x {args.eventos} transferências")
+        print(f"{'consulta':<28}{'funcionários':>13}{'férias':>8}{'consultas':>11}{'linhas':>10}{'ms':>10}")
+        for nome, consulta in [("outerjoin + joinedload", consultaAntiga), ("selectinload", consultaNova)]:
+            r = medir(engine, Sessao, consulta, args.repeticoes)
+            print(f"{nome:<28}{r['funcionarios']:>13}{r['ferias']:>8}{r['consultas']:>11}{r['linhas']:>10}{r['ms']:>10}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
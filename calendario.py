@@ -0,0 +1,161 @@
+import os
+import threading
+from bisect import bisect_right, insort
+from datetime import date
+from sqlalchemy import func
+from eventos import broadcaster
+from models.models import Employer, Feria
+
+# Índice de férias por sector com os extremos ordenados (dias ordinais).
+# Ausentes no dia d = inícios <= d - fins (exclusivos) <= d, com duas buscas
+# binárias; um intervalo de dias varre só os extremos que caem dentro dele.
+# O índice é mantido a partir dos eventos "ferias.criada" do broadcaster e
+# reconstruído quando o sector de um funcionário muda, há arquivo de
+# inativos ou falta histórico.
+
+COBERTURA_MINIMA = float(os.getenv("COBERTURA_MINIMA", "0.5"))  # fração do sector que tem de ficar
+COBERTURA_MODO = os.getenv("COBERTURA_MODO", "avisar")  # "avisar" ou "rejeitar"
+STATUS_EFECTIVO = ["ACTIVO", "LICENCA"]
+
+
+class CoberturaInsuficiente(ValueError):
+    pass
+
+
+def dia(valor):
+    return (valor.date() if hasattr(valor, "date") else valor).toordinal()
+
+
+class Extremos:
+    def __init__(self):
+        self.inicios = []
+        self.fins = []  # dia seguinte ao fim (exclusivo)
+
+    def adicionar(self, inicio, fim):
+        insort(self.inicios, inicio)
+        insort(self.fins, fim + 1)
+
+    def ausentes(self, d):
+        return bisect_right(self.inicios, d) - bisect_right(self.fins, d)
+
+    def varrer(self, de, ate):
+        """Gera (dia, ausentes) de de até ate, inclusive"""
+        ativos = self.ausentes(de)
+        i = bisect_right(self.inicios, de)
+        j = bisect_right(self.fins, de)
+        yield de, ativos
+        for d in range(de + 1, ate + 1):
+            while i < len(self.inicios) and self.inicios[i] <= d:
+                ativos += 1
+                i += 1
+            while j < len(self.fins) and self.fins[j] <= d:
+                ativos -= 1
+                j += 1
+            yield d, ativos
+
+    def maximo(self, de, ate):
+        """Maior número de ausentes em simultâneo no intervalo"""
+        maior = self.ausentes(de)
+        ativos = maior
+        # só os dias em que alguém começa podem aumentar o máximo
+        i = bisect_right(self.inicios, de)
+        j = bisect_right(self.fins, de)
+        while i < len(self.inicios) and self.inicios[i] <= ate:
+            d = self.inicios[i]
+            while j < len(self.fins) and self.fins[j] <= d:
+                ativos -= 1
+                j += 1
+            while i < len(self.inicios) and self.inicios[i] == d:
+                ativos += 1
+                i += 1
+            maior = max(maior, ativos)
+        return maior
+
+
+class CalendarioFerias:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequencia = None
+        self.setores = {}
+
+    def carregar(self, db):
+        self.setores = {}
+        linhas = db.query(Employer.sector, Feria.data_inicio_ferias, Feria.data_fim_ferias).join(
+            Employer, Employer.id == Feria.funcionario_id
+        )
+        for sector, inicio, fim in linhas:
+            # registos antigos com o fim antes do início contariam -1 ausentes
+            if inicio and fim and dia(fim) >= dia(inicio):
+                self.setores.setdefault(sector, Extremos()).adicionar(dia(inicio), dia(fim))
+
+    def atualizar(self, db):
+        with self.lock:
+            atual = broadcaster.sequencia
+            if self.sequencia == atual:
+                return
+            eventos = [evento for evento in list(broadcaster.historico) if evento["seq"] > (self.sequencia or 0)]
+            reconstruir = self.sequencia is None or not eventos or eventos[0]["seq"] != self.sequencia + 1
+            if not reconstruir:
+                for evento in eventos:
+                    if evento["tipo"] == "employer.arquivado" or (
+                        evento["tipo"] == "employer.atualizado" and "sector" in evento["dados"].get("campos", {})
+                    ):
+                        reconstruir = True
+                        break
+            if reconstruir:
+                self.sequencia = atual
+                self.carregar(db)
+                return
+            for evento in eventos:
+                if evento["tipo"] == "ferias.criada":
+                    dados = evento["dados"]
+                    self.setores.setdefault(dados["sector"], Extremos()).adicionar(
+                        dia(dados["data_inicio_ferias"]), dia(dados["data_fim_ferias"])
+                    )
+            self.sequencia = eventos[-1]["seq"]
+
+    def dias(self, db, sector, de, ate):
+        """Número de ausentes por dia no sector"""
+        self.atualizar(db)
+        with self.lock:
+            extremos = self.setores.get(sector, Extremos())
+            return [
+                {"data": date.fromordinal(d).isoformat(), "ausentes": ausentes}
+                for d, ausentes in extremos.varrer(dia(de), dia(ate))
+            ]
+
+    def maximoAusentes(self, db, sector, inicio, fim):
+        self.atualizar(db)
+        with self.lock:
+            return self.setores.get(sector, Extremos()).maximo(dia(inicio), dia(fim))
+
+
+calendario = CalendarioFerias()
+
+
+def efectivo(db, sector):
+    """Funcionários do sector em serviço (incluindo os de licença)"""
+    return db.query(func.count(Employer.id)).filter(
+        Employer.sector == sector, Employer.status.in_(STATUS_EFECTIVO)
+    ).scalar()
+
+
+def verificarCobertura(db, sector, inicio, fim):
+    """
+    Verifica se as novas férias deixam o sector abaixo da cobertura mínima.
+    Devolve um aviso (ou None); no modo "rejeitar" lança CoberturaInsuficiente.
+    """
+    total = efectivo(db, sector)
+    if not total:
+        return None
+    ausentes = calendario.maximoAusentes(db, sector, inicio, fim) + 1
+    presentes = total - ausentes
+    if presentes >= total * COBERTURA_MINIMA:
+        return None
+    aviso = (
+        f"Cobertura do sector {sector} desce para {max(presentes, 0)} de {total} "
+        f"entre {inicio.date()} e {fim.date()} (mínimo {COBERTURA_MINIMA:.0%})"
+    )
+    if COBERTURA_MODO == "rejeitar":
+        raise CoberturaInsuficiente(aviso)
+    return aviso
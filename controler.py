@@ -1,17 +1,113 @@
-from sqlalchemy import create_engine, or_
-from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy import create_engine, or_, func, inspect, text, bindparam, select, update, insert, delete
+from sqlalchemy.orm import sessionmaker, selectinload
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from models.models import Base, Employer, Feria, Transferencia, Reforma, Suspenso, Falecido
+import os
+import time
+from models.models import Base, Employer, Feria, Transferencia, Reforma, Suspenso, Falecido, StatusTransition, IdentificacaoDuplicada, STATUS_ACTIVOS
+from models.models import EmployerHistorico, FeriaHistorico, TransferenciaHistorico, ReformaHistorico, FalecidoHistorico, SuspensoHistorico
+from eventos import publicar
+from calendario import verificarCobertura
+from organizacao import atribuirUnidade, migrarUnidades, unidadesPorNome, queryEmployersUnidade
 
 # Configurar a conexão com o banco de dados
 
 engine = create_engine('sqlite:///database/hospital.db', echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica só de leitura (cópia feita com a API de backup do SQLite, ver backups.py)
+# para relatórios, exportações e /dina, para não competirem com as escritas
+REPLICA_PATH = os.getenv("REPLICA_PATH", "database/replica.db")
+REPLICA_MAX_ATRASO = float(os.getenv("REPLICA_MAX_ATRASO", "900"))  # segundos
+replica_engine = create_engine(f'sqlite:///file:{REPLICA_PATH}?mode=ro&uri=true', echo=False)
+ReplicaSession = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+# Índices de versões anteriores, substituídos pelos índices parciais de status
+INDICES_OBSOLETOS = ["ix_employers_status", "ix_employers_activos"]
+
 # Criar as tabelas do banco de dados se não existirem
 def create_base():
     Base.metadata.create_all(bind=engine)
+    adicionarColunas()
+    usarAutoincrement()
+    prepararTransicoes()
+    with engine.begin() as conn:
+        for nome in INDICES_OBSOLETOS:
+            conn.execute(text(f"DROP INDEX IF EXISTS {nome}"))
+    deduplicarIdentificacao()
+    # create_all não adiciona índices novos a tabelas que já existem;
+    # um IntegrityError aqui impede o arranque em vez de deixar a base sem o índice
+    # (sqlite_master e não checkfirst: a reflexão ignora índices sobre expressões)
+    with engine.connect() as conn:
+        existentes = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existentes:
+                index.create(bind=engine)
+    # liga os funcionários às unidades orgânicas a partir de sector/reparticao
+    with SessionLocal() as db:
+        migrarUnidades(db)
+
+def adicionarColunas():
+    """create_all não altera tabelas existentes: adiciona as colunas novas dos modelos"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existentes = {coluna["name"] for coluna in inspector.get_columns(table.name)}
+            for coluna in table.columns:
+                if coluna.name not in existentes:
+                    tipo = coluna.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {coluna.name} {tipo}"))
+
+def deduplicarIdentificacao():
+    """
+    Prepara employers para os índices únicos de bi e nuit. Valores em branco
+    passam a NULL. Um valor repetido por vários funcionários (ex: o "string"
+    de exemplo do Swagger) não identifica nenhum deles: passa a NULL em todos
+    e o original fica em identificacoes_duplicadas para ser corrigido à mão.
+    """
+    with engine.begin() as conn:
+        for campo in ("bi", "nuit"):
+            coluna = getattr(Employer, campo)
+            conn.execute(update(Employer).where(func.trim(coluna) == "").values({campo: None}))
+            repetidos = select(coluna).where(coluna.is_not(None)).group_by(coluna).having(func.count() > 1)
+            linhas = conn.execute(select(Employer.id, coluna).where(coluna.in_(repetidos))).all()
+            if not linhas:
+                continue
+            conn.execute(insert(IdentificacaoDuplicada.__table__), [
+                {"funcionario_id": id, "campo": campo, "valor": valor, "detectado": datetime.utcnow()}
+                for id, valor in linhas
+            ])
+            conn.execute(update(Employer).where(Employer.id.in_([id for id, _ in linhas])).values({campo: None}))
+            print(f"{len(linhas)} funcionários com {campo} repetido: valores movidos para identificacoes_duplicadas")
+
+def usarAutoincrement():
+    """
+    Reconstrói as tabelas criadas antes de sqlite_autoincrement: sem
+    AUTOINCREMENT o SQLite reutiliza o maior id depois de apagado (arquivo).
+    Os índices e o trigger são recriados a seguir por create_base.
+    """
+    with engine.begin() as conn:
+        # sem verificar as vistas de histórico enquanto a tabela não existe
+        conn.execute(text("PRAGMA legacy_alter_table = ON"))
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            ddl = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nome"), {"nome": table.name}
+            ).scalar()
+            if "AUTOINCREMENT" in ddl.upper():
+                continue
+            novo = f"{table.name}_novo"
+            conn.execute(text(f"DROP TABLE IF EXISTS {novo}"))
+            criar = str(CreateTable(table).compile(dialect=engine.dialect)).strip()
+            conn.execute(text(criar.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {novo} ", 1)))
+            lista = ", ".join(coluna.name for coluna in table.columns)
+            conn.execute(text(f"INSERT INTO {novo} ({lista}) SELECT {lista} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {novo} RENAME TO {table.name}"))
+        conn.execute(text("PRAGMA legacy_alter_table = OFF"))
 
 def get_db():
     db = SessionLocal()
@@ -20,53 +116,173 @@ def get_db():
     finally:
         db.close()
 
+class IdentificacaoEmConflito(ValueError):
+    """O bi e o nuit indicados pertencem a funcionários diferentes"""
+
+def limparIdentificacao(dados):
+    """
+    bi/nuit em branco passam a NULL: os índices únicos aceitam vários NULL,
+    mas não dois funcionários com nuit "".
+    """
+    for campo in ("bi", "nuit"):
+        if campo in dados and not (dados[campo] or "").strip():
+            dados[campo] = None
+    return dados
+
+def procurarEmployer(db, dados):
+    """
+    Funcionário com o mesmo bi ou nuit, ou None.
+    Valores em branco nunca identificam ninguém.
+    """
+    condicoes = [
+        getattr(Employer, campo) == dados[campo]
+        for campo in ("bi", "nuit") if (dados.get(campo) or "").strip()
+    ]
+    if not condicoes:
+        return None
+    encontrados = db.query(Employer).filter(or_(*condicoes)).limit(2).all()
+    if len(encontrados) > 1:
+        raise IdentificacaoEmConflito(
+            f"bi {dados.get('bi')!r} e nuit {dados.get('nuit')!r} correspondem a funcionários diferentes"
+        )
+    return encontrados[0] if encontrados else None
+
+def upsertEmployer(db, dados):
+    """
+    Insere o empregado ou, se já existir um com o mesmo bi ou nuit,
+    atualiza-o (importações em lote). Devolve (empregado, criado).
+    """
+    limparIdentificacao(dados)
+    funcionario = procurarEmployer(db, dados)
+    if funcionario:
+        for key, value in dados.items():
+            setattr(funcionario, key, value)
+        atribuirUnidade(db, funcionario)
+        return funcionario, False
+    funcionario = Employer(**dados)
+    atribuirUnidade(db, funcionario)
+    db.add(funcionario)
+    return funcionario, True
+
+def replicaAtualizada():
+    """A réplica existe e não é mais antiga que REPLICA_MAX_ATRASO"""
+    try:
+        return time.time() - os.path.getmtime(REPLICA_PATH) <= REPLICA_MAX_ATRASO
+    except OSError:
+        return False
+
+def get_replica_db():
+    # réplica em falta ou atrasada demais: lê da base principal
+    db = ReplicaSession() if replicaAtualizada() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def getEmployerByReparticao(reparticao):
-    """Retorna a lista de empregados filtrados pela repartição"""
+    """Retorna a lista de empregados da repartição (e dos seus sectores)"""
     with SessionLocal() as db:
-        return db.query(Employer).filter_by(reparticao=reparticao).all()
+        return queryEmployersUnidade(db, unidadesPorNome(db, reparticao, "reparticao")).all()
 
 def getEmployerBySector(sector):
     """Retorna a lista de empregados filtrados pelo setor"""
     with SessionLocal() as db:
-        return db.query(Employer).filter_by(sector=sector).all()
+        return queryEmployersUnidade(db, unidadesPorNome(db, sector, "sector")).all()
 
 def getById(id):
     """Retorna um empregado com base no ID"""
     with SessionLocal() as db:
         return db.query(Employer).filter_by(id=id).first()
 
+SETORES = ["Maternidade", "Laboratório", "Psiquiatria", "Medicina 1"]
+
 def getLen():
     """Retorna o número de empregados em setores específicos"""
-    setores = ["Maternidade", "Laboratório", "Psiquiatria", "Medicina 1"]
     contagem = {}
     with SessionLocal() as db:
-        for setor in setores:
+        for setor in SETORES:
             contagem[setor] = db.query(Employer).filter_by(sector=setor).count()
     return contagem
 
 STATUS_TRANSITIONS = {
-    "ACTIVO": ["LICENCA", "TRANSFERIDO", "APOSENTADO", "SUSPENSO", "FALECIDO"],
-    "LICENCA": ["ACTIVO", "FALECIDO", "TRANSFERIDO"],
-    "TRANSFERIDO": ["ACTIVO"],
-    "APOSENTADO": [],
-    "SUSPENSO": ["ACTIVO"],
-    "FALECIDO": [],
+    "ACTIVO": ["LICENCA", "DISPENSA", "TRANSFERIDO", "APOSENTADO", "SUSPENSO", "FALECIDO", "Removido"],
+    "DISPENSA": ["ACTIVO", "FALECIDO", "Removido"],
+    "LICENCA": ["ACTIVO", "FALECIDO", "TRANSFERIDO", "Removido"],
+    "TRANSFERIDO": ["ACTIVO", "Removido"],
+    "APOSENTADO": ["Removido"],
+    "SUSPENSO": ["ACTIVO", "Removido"],
+    "FALECIDO": ["Removido"],
     "Removido":["ACTIVO"]
 
 }
 
-def is_valid_transition(current_status, new_status):
-    """ Verifica se a transição de status é válida """
-    return new_status in STATUS_TRANSITIONS.get(current_status, [])
-
-def update_status(funcionario, new_status):
-    """ Atualiza o status do funcionário se a transição for válida """
-    if is_valid_transition(funcionario.status, new_status):
-        funcionario.status = new_status
-    else:
-        raise ValueError(f"Transição de status inválida: {funcionario.status} -> {new_status}")
+def prepararTransicoes():
+    """
+    Guarda STATUS_TRANSITIONS na tabela status_transitions e cria o trigger
+    que recusa qualquer UPDATE de status fora dela (incluindo o PUT /employer).
+    """
+    with engine.begin() as conn:
+        conn.execute(delete(StatusTransition.__table__))
+        conn.execute(insert(StatusTransition.__table__), [
+            {"origem": origem, "destino": destino}
+            for origem, destinos in STATUS_TRANSITIONS.items() for destino in destinos
+        ])
+        conn.execute(text("DROP TRIGGER IF EXISTS validar_status"))
+        conn.execute(text("""
+            CREATE TRIGGER validar_status BEFORE UPDATE OF status ON employers
+            WHEN OLD.status IS NOT NULL AND NEW.status IS NOT OLD.status AND NOT EXISTS (
+                SELECT 1 FROM status_transitions WHERE origem = OLD.status AND destino = NEW.status
+            )
+            BEGIN
+                SELECT RAISE(ABORT, 'Transição de status inválida');
+            END
+        """))
+
+class TransicaoInvalida(ValueError):
+    pass
+
+class FuncionarioNaoEncontrado(ValueError):
+    pass
+
+class IntervaloInvalido(ValueError):
+    pass
+
+def transicionar(db, ids, new_status):
+    """
+    Muda o status num único UPDATE condicional: só as linhas cujo status atual
+    permite new_status (segundo status_transitions) são alteradas.
+    Devolve as linhas (id, sector) alteradas.
+    """
+    permitidos = select(StatusTransition.origem).where(StatusTransition.destino == new_status)
+    return db.execute(
+        update(Employer)
+        .where(Employer.id.in_(list(ids)), Employer.status.in_(permitidos))
+        .values(status=new_status, status_alterado=datetime.utcnow())
+        .returning(Employer.id, Employer.sector)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+def mudarStatus(db, id, new_status):
+    """
+    Transição de um funcionário. Lança FuncionarioNaoEncontrado se o id não
+    existir e TransicaoInvalida se o status atual não permitir new_status.
+    """
+    alterados = transicionar(db, [id], new_status)
+    if alterados:
+        return alterados[0]
+    atual = db.query(Employer.status).filter(Employer.id == id).first()
+    if atual is None:
+        raise FuncionarioNaoEncontrado(f"Funcionário {id} não encontrado")
+    raise TransicaoInvalida(f"Transição de status inválida: {atual.status} -> {new_status}")
+
+def publicarStatus(funcionario_id, anterior, status):
+    """Publica a mudança de status no feed /events"""
+    if anterior != status:
+        publicar("employer.status", {"id": funcionario_id, "anterior": anterior, "status": status})
 
 def addFerias(id, start=datetime.now(), end=datetime.now()):
+    if end < start:
+        raise IntervaloInvalido(f"o fim das férias ({end:%Y-%m-%d}) é anterior ao início ({start:%Y-%m-%d})")
     try:
         with SessionLocal() as db:
             nova_feria = Feria(
@@ -74,10 +290,15 @@ def addFerias(id, start=datetime.now(), end=datetime.now()):
                 data_inicio_ferias=start,
                 data_fim_ferias=end
             )
-            funcionario = db.query(Employer).filter_by(id=id).first()
-            update_status(funcionario, "LICENCA")
+            funcionario = mudarStatus(db, id, "LICENCA")
+            aviso = verificarCobertura(db, funcionario.sector, start, end)
             db.add(nova_feria)
             db.commit()
+            publicar("ferias.criada", {"funcionario_id": funcionario.id, "sector": funcionario.sector, "data_inicio_ferias": start, "data_fim_ferias": end})
+            publicarStatus(funcionario.id, None, "LICENCA")
+            if aviso:
+                print(aviso)
+                publicar("ferias.cobertura", {"sector": funcionario.sector, "aviso": aviso})
             return nova_feria
     except (SQLAlchemyError, ValueError) as e:
         db.rollback()
@@ -92,10 +313,11 @@ def addTransferencia(id, start=datetime.now(), lugar=""):
                 data_transferido=start,
                 lugar_transferido=lugar
             )
-            funcionario = db.query(Employer).filter_by(id=id).first()
-            update_status(funcionario, "TRANSFERIDO")
+            funcionario = mudarStatus(db, id, "TRANSFERIDO")
             db.add(transferencia)
             db.commit()
+            publicar("transferencia.criada", {"funcionario_id": funcionario.id, "data_transferido": start, "lugar_transferido": lugar})
+            publicarStatus(funcionario.id, None, "TRANSFERIDO")
             return transferencia
     except (SQLAlchemyError, ValueError) as e:
         db.rollback()
@@ -110,10 +332,11 @@ def addReforma(id, data, idade):
                 data_reforma=data,
                 idade_reforma=idade
             )
-            funcionario = db.query(Employer).filter_by(id=id).first()
-            update_status(funcionario, "APOSENTADO")
+            funcionario = mudarStatus(db, id, "APOSENTADO")
             db.add(reforma)
             db.commit()
+            publicar("reforma.criada", {"funcionario_id": funcionario.id, "data_reforma": data, "idade_reforma": idade})
+            publicarStatus(funcionario.id, None, "APOSENTADO")
             return reforma
     except (SQLAlchemyError, ValueError) as e:
         db.rollback()
@@ -128,10 +351,11 @@ def addSuspenso(id, data=datetime.now(), motivo=""):
                 data_suspenso=data,
                 motivo=motivo
             )
-            funcionario = db.query(Employer).filter_by(id=id).first()
-            update_status(funcionario, "SUSPENSO")
+            funcionario = mudarStatus(db, id, "SUSPENSO")
             db.add(suspenso)
             db.commit()
+            publicar("suspenso.criado", {"funcionario_id": funcionario.id, "data_suspenso": data, "motivo": motivo})
+            publicarStatus(funcionario.id, None, "SUSPENSO")
             return suspenso
     except (SQLAlchemyError, ValueError) as e:
         db.rollback()
@@ -146,158 +370,205 @@ def addFalecido(id, data, idade):
                 data_falecimento=data,
                 idade=idade
             )
-            funcionario = db.query(Employer).filter_by(id=id).first()
-            update_status(funcionario, "FALECIDO")
+            funcionario = mudarStatus(db, id, "FALECIDO")
             db.add(falecido)
             db.commit()
+            publicar("falecido.criado", {"funcionario_id": funcionario.id, "data_falecimento": data, "idade": idade})
+            publicarStatus(funcionario.id, None, "FALECIDO")
             return falecido
     except (SQLAlchemyError, ValueError) as e:
         db.rollback()
         print(f"Database error occurred: {str(e)}")
         raise
 
+def setStatus(ids, new_status):
+    """Transição em lote: devolve os ids alterados e os recusados"""
+    ids = set(ids)
+    with SessionLocal() as db:
+        alterados = [linha.id for linha in transicionar(db, ids, new_status)]
+        db.commit()
+    for id in alterados:
+        publicarStatus(id, None, new_status)
+    return {"alterados": sorted(alterados), "recusados": sorted(ids - set(alterados))}
+
+# Os registos de eventos leem das vistas de histórico: incluem os funcionários arquivados
 def getTransferencia():
     with SessionLocal() as db:
-        return db.query(Transferencia).join(Employer).all()
+        return db.query(TransferenciaHistorico).join(EmployerHistorico, EmployerHistorico.id == TransferenciaHistorico.funcionario_id).all()
 
 def getSuspenso():
     with SessionLocal() as db:
-        return db.query(Suspenso).join(Employer).all()
+        return db.query(SuspensoHistorico).join(EmployerHistorico, EmployerHistorico.id == SuspensoHistorico.funcionario_id).all()
 
 def getReforma():
     with SessionLocal() as db:
-        return db.query(Reforma).join(Employer).all()
+        return db.query(ReformaHistorico).join(EmployerHistorico, EmployerHistorico.id == ReformaHistorico.funcionario_id).all()
 
 def getFalecido():
     with SessionLocal() as db:
-        return db.query(Falecido).join(Employer).all()
+        return db.query(FalecidoHistorico).join(EmployerHistorico, EmployerHistorico.id == FalecidoHistorico.funcionario_id).all()
 
 def getFerias(search=None):
     with SessionLocal() as db:
         ferias=[]
         if search!=None:
-            f=db.query(Feria).filter(Feria.data_inicio_ferias.like(f'%{search}%'))
+            f=db.query(FeriaHistorico).filter(FeriaHistorico.data_inicio_ferias.like(f'%{search}%'))
         else:
-            f=db.query(Feria).all()
+            f=db.query(FeriaHistorico).all()
         
         for feria in f:
-            funcionario=db.query(Employer).filter_by(id=feria.funcionario_id).first()
+            funcionario=db.query(EmployerHistorico).filter_by(id=feria.funcionario_id).first()
             ferias.append({"nome":funcionario.nome+" "+funcionario.apelido,'data_inicio_ferias':feria.data_inicio_ferias,"data_fim_ferias":feria.data_fim_ferias})
         return ferias
 
-def getEmployersRemovido():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
-                Employer.status == "Removido"
-            ).options(
-                joinedload(Employer.ferias),
-                joinedload(Employer.transferencias)  # Carregar dados de transferência
-            ).all()
-            return employers
-    except SQLAlchemyError as e:
-        print(f"An error occurred: {e}")
-        return None
-
-def getEmployersDeath():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Falecido).filter(
-                Employer.status == "FALECIDO"
-            ).options(joinedload(Employer.ferias)).all()
-            return employers
-    except SQLAlchemyError as e:
-        print(f"An error occurred: {e}")
-        return None
+# Relações que podem ser carregadas a pedido com o parâmetro include=
+RELACOES = {
+    "ferias": Employer.ferias,
+    "transferencias": Employer.transferencias,
+    "reformas": Employer.reformas,
+    "falecimentos": Employer.falecimentos,
+    "suspensos": Employer.suspensos,
+}
 
-def getEmployersLICENCA(seaarch=None):
+def parseInclude(include, default=()):
+    """Converte "ferias,transferencias" numa tupla de relações válidas"""
+    if include is None:
+        return tuple(default)
+    nomes = [nome.strip() for nome in include.split(",") if nome.strip()]
+    invalidos = [nome for nome in nomes if nome not in RELACOES]
+    if invalidos:
+        raise ValueError(f"Relações inválidas: {', '.join(invalidos)}")
+    return tuple(nomes)
+
+def valoresLiterais(nome, valores):
+    """IN com os valores escritos no SQL: o SQLite só usa um índice parcial se
+    o WHERE da consulta contiver o do índice, o que não verifica com parâmetros"""
+    return bindparam(nome, list(valores), expanding=True, literal_execute=True)
+
+def queryEmployers(db, status, include=(), search=None, historico=False):
+    """
+    Monta a consulta de empregados por status.
+    As relações são carregadas com selectinload (uma consulta IN por relação)
+    em vez de joins, evitando o produto cartesiano férias x transferências.
+    Com historico=True lê das vistas de histórico (quadro atual + arquivo).
+    """
+    modelo = EmployerHistorico if historico else Employer
+    query = db.query(modelo).filter(modelo.status.in_(valoresLiterais("status", status)))
+    if not historico:
+        # repete a condição do índice parcial que cobre estes status
+        if set(status) <= set(STATUS_ACTIVOS):
+            query = query.filter(Employer.status.in_(valoresLiterais("activos", STATUS_ACTIVOS)))
+        elif not set(status) & set(STATUS_ACTIVOS):
+            query = query.filter(Employer.status.not_in(valoresLiterais("activos", STATUS_ACTIVOS)))
+    if search:
+        query = query.filter(modelo.nome.like(f"%{search}%"))
+    return query.options(*[selectinload(getattr(modelo, nome)) for nome in include])
+
+def listEmployers(status, include=(), search=None, historico=False, relancar=False):
+    """
+    Retorna a lista de empregados com os status dados e as relações pedidas.
+    Em caso de erro devolve None, ou relança-o com relancar=True.
+    """
     try:
         with SessionLocal() as db:
-            if seaarch ==None:
-
-                employers = db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
-                    Employer.status == "LICENCA"
-                ).options(joinedload(Employer.ferias)).all()
-            else:
-                employers = db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
-                    Employer.status == "LICENCA"
-                ).options(joinedload(Employer.ferias)).filter(Employer.nome.like(f"%{seaarch}%")).all()
-            return employers
+            return queryEmployers(db, status, include, search, historico).all()
     except SQLAlchemyError as e:
         print(f"An error occurred: {e}")
+        if relancar:
+            raise
         return None
 
-def getEmployersTransferido():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Transferencia).filter(
-                Employer.status == "TRANSFERIDO"
-            ).options(
-                joinedload(Employer.ferias),
-                joinedload(Employer.transferencias)  # Carregar dados de transferência
-            ).all()
-            return employers
-    except SQLAlchemyError as e:
-        print(f"An error occurred: {e}")
-        return None
+# Colunas permitidas na consulta combinada (/employers/query)
+COLUNAS_IGUAL = {
+    "nome", "apelido", "bi", "provincia", "naturalidade", "residencia", "sexo",
+    "sector", "reparticao", "especialidade", "categoria", "nuit", "status",
+    "careira", "faixa_etaria", "ano_inicio",
+}
+COLUNAS_INTERVALO = {"nascimento", "inicio_funcoes", "ano_inicio"}
+COLUNAS_ORDEM = COLUNAS_IGUAL | COLUNAS_INTERVALO | {"id"}
+
+def filtrarEmployers(db, igual=None, intervalo=None, nome=None):
+    """
+    Compila os filtros numa única consulta.
+    Valores em lista viram IN; intervalos aceitam "de" e/ou "ate" (inclusivos).
+    """
+    query = db.query(Employer)
+    for coluna, valor in (igual or {}).items():
+        if coluna not in COLUNAS_IGUAL:
+            raise ValueError(f"Coluna não permitida no filtro: {coluna}")
+        campo = getattr(Employer, coluna)
+        if isinstance(valor, (list, tuple, set)):
+            query = query.filter(campo.in_(list(valor)))
+        else:
+            query = query.filter(campo == valor)
+    for coluna, limites in (intervalo or {}).items():
+        if coluna not in COLUNAS_INTERVALO:
+            raise ValueError(f"Coluna não permitida no intervalo: {coluna}")
+        campo = getattr(Employer, coluna)
+        if limites.get("de") is not None:
+            query = query.filter(campo >= limites["de"])
+        if limites.get("ate") is not None:
+            query = query.filter(campo <= limites["ate"])
+    if nome:
+        query = query.filter(Employer.nome.like(f"%{nome}%"))
+    return query
+
+def ordenarEmployers(query, ordenar=None):
+    """Aplica as chaves de ordenação; "-coluna" ordena de forma decrescente"""
+    chaves = []
+    for chave in ordenar or []:
+        coluna = chave.lstrip("-")
+        if coluna not in COLUNAS_ORDEM:
+            raise ValueError(f"Coluna não permitida na ordenação: {coluna}")
+        campo = getattr(Employer, coluna)
+        chaves.append(campo.desc() if chave.startswith("-") else campo.asc())
+    # id no fim garante uma paginação estável
+    chaves.append(Employer.id.asc())
+    return query.order_by(*chaves)
+
+def queryEmployersFiltro(igual=None, intervalo=None, nome=None, ordenar=None,
+                         include=(), limit=50, offset=0, total=False):
+    """Retorna uma página de empregados e, se pedido, o total da consulta"""
+    invalidos = [relacao for relacao in include if relacao not in RELACOES]
+    if invalidos:
+        raise ValueError(f"Relações inválidas: {', '.join(invalidos)}")
+    with SessionLocal() as db:
+        query = filtrarEmployers(db, igual, intervalo, nome)
+        resultado = {"limit": limit, "offset": offset}
+        if total:
+            # contagem só sobre a chave primária, sem ordenação nem relações
+            resultado["total"] = query.with_entities(func.count(Employer.id)).scalar()
+        resultado["items"] = ordenarEmployers(query, ordenar).options(
+            *[selectinload(RELACOES[relacao]) for relacao in include]
+        ).limit(limit).offset(offset).all()
+        return resultado
 
-def getEmployersReforma():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Reforma).filter(
-                Employer.status == "APOSENTADO"
-            ).options(joinedload(Employer.ferias)).all()
-            return employers
-    except SQLAlchemyError as e:
-        print(f"An error occurred: {e}")
-        return None
+def getEmployersRemovido(include=None):
+    return listEmployers(["Removido"], parseInclude(include, ("ferias", "transferencias")), historico=True)
 
-def getEmployersSuspensed():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Suspenso).filter(
-                Employer.status == "SUSPENSO"
-            ).options(joinedload(Employer.ferias)).all()
-            return employers
-    except SQLAlchemyError as e:
-        print(f"An error occurred: {e}")
-        return None
+def getEmployersDeath(include=None):
+    return listEmployers(["FALECIDO"], parseInclude(include, ("ferias",)), historico=True)
 
-def getEmployers():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
-                or_(
-                    Employer.status == "ACTIVO",
-                    Employer.status == "DISPENSA",
-                    Employer.status == "LICENCA"
-                )
-            ).options(joinedload(Employer.ferias)).all()
-            return employers
-    except SQLAlchemyError as e:
-        db.rollback()
-        print(f"Database error occurred: {str(e)}")
-        raise
+def getEmployersLICENCA(seaarch=None, include=None):
+    return listEmployers(["LICENCA"], parseInclude(include, ("ferias",)), seaarch)
 
+def getEmployersTransferido(include=None):
+    return listEmployers(["TRANSFERIDO"], parseInclude(include, ("ferias", "transferencias")))
 
+def getEmployersReforma(include=None):
+    return listEmployers(["APOSENTADO"], parseInclude(include, ("ferias",)), historico=True)
 
+def getEmployersSuspensed(include=None):
+    return listEmployers(["SUSPENSO"], parseInclude(include, ("ferias",)))
 
+def getEmployers(include=None):
+    return listEmployers(STATUS_ACTIVOS, parseInclude(include, ("ferias",)), relancar=True)
 
+def getEmployerssearche(include=None):
+    return listEmployers(["LICENCA"], parseInclude(include, ("ferias",)))
 
-def getEmployerssearche():
-    try:
-        with SessionLocal() as db:
-            employers = db.query(Employer).outerjoin(Feria).outerjoin(Transferencia).filter(
-                or_(
-                    
-                    Employer.status == "LICENCA"
-                )
-            ).options(joinedload(Employer.ferias)).all()
-            return employers
-    except SQLAlchemyError as e:
-        db.rollback()
-        print(f"Database error occurred: {str(e)}")
-        raise
+def getEmployersPassados(include=None):
+    return listEmployers(["TRANSFERIDO", "SUSPENSO", "FALECIDO"], parseInclude(include), historico=True)
 
 
 
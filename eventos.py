@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+# Feed de alterações em processo para os dashboards (/events).
+# As rotas de escrita correm em threads do FastAPI, por isso publicar() é
+# síncrona e entrega os eventos ao loop de cada cliente com call_soon_threadsafe.
+
+HISTORICO = 1000  # eventos guardados para retomar a partir de um número de sequência
+FILA_CLIENTE = 100  # eventos pendentes por cliente antes de ser desligado
+HEARTBEAT = 15  # segundos entre comentários de keep-alive
+
+
+class Cliente:
+    def __init__(self, loop, tamanho=FILA_CLIENTE):
+        self.loop = loop
+        self.fila = asyncio.Queue(maxsize=tamanho)
+        self.atrasado = False
+
+    def enviar(self, evento):
+        try:
+            self.loop.call_soon_threadsafe(self._put, evento)
+        except RuntimeError:
+            # loop já fechado: o cliente desligou-se
+            self.atrasado = True
+
+    def _put(self, evento):
+        if self.atrasado:
+            return
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # cliente lento: fecha a ligação em vez de acumular memória,
+            # o cliente volta a ligar com Last-Event-ID e retoma do histórico
+            self.atrasado = True
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)
+
+
+class Broadcaster:
+    def __init__(self, historico=HISTORICO):
+        self.sequencia = 0
+        self.historico = deque(maxlen=historico)
+        self.clientes = set()
+        self.lock = threading.Lock()
+
+    def publicar(self, tipo, dados):
+        """Regista o evento e entrega-o a todos os clientes ligados"""
+        with self.lock:
+            self.sequencia += 1
+            evento = {
+                "seq": self.sequencia,
+                "tipo": tipo,
+                "data": datetime.utcnow().isoformat(),
+                "dados": dados,
+            }
+            self.historico.append(evento)
+            clientes = list(self.clientes)
+        for cliente in clientes:
+            cliente.enviar(evento)
+        return evento
+
+    def ligar(self, desde=None):
+        """Regista um cliente e devolve os eventos perdidos desde a sequência dada"""
+        cliente = Cliente(asyncio.get_running_loop())
+        with self.lock:
+            self.clientes.add(cliente)
+            perdidos = []
+            reset = False
+            if desde is not None:
+                perdidos = [evento for evento in self.historico if evento["seq"] > desde]
+                primeiro = self.historico[0]["seq"] if self.historico else self.sequencia + 1
+                # eventos já fora do histórico (ou servidor reiniciado):
+                # o cliente tem de recarregar tudo
+                reset = desde < primeiro - 1 or desde > self.sequencia
+            atual = self.sequencia
+        return cliente, perdidos, reset, atual
+
+    def desligar(self, cliente):
+        with self.lock:
+            self.clientes.discard(cliente)
+
+    async def stream(self, desde=None):
+        """Gera os eventos no formato Server-Sent Events"""
+        cliente, perdidos, reset, atual = self.ligar(desde)
+        try:
+            ultimo = desde or 0
+            if reset:
+                ultimo = atual
+                yield formatar({"seq": atual, "tipo": "reset", "dados": {}})
+            else:
+                for evento in perdidos:
+                    ultimo = evento["seq"]
+                    yield formatar(evento)
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cliente.fila.get(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if evento is None:
+                    break
+                # evento já enviado na fase de recuperação
+                if evento["seq"] <= ultimo:
+                    continue
+                ultimo = evento["seq"]
+                yield formatar(evento)
+        finally:
+            self.desligar(cliente)
+
+
+def formatar(evento):
+    return f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+
+
+broadcaster = Broadcaster()
+
+
+def publicar(tipo, dados):
+    return broadcaster.publicar(tipo, dados)
@@ -0,0 +1,115 @@
+import os
+from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from models.models import IdempotencyKey
+from controler import SessionLocal
+
+# Repetições de POST com o mesmo cabeçalho Idempotency-Key devolvem a
+# resposta guardada em vez de voltar a escrever (clientes móveis com rede instável).
+
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+LIMPEZA_INTERVALO = timedelta(minutes=10)
+# Reserva sem resposta há mais do que isto: o pedido morreu a meio e a chave pode ser reutilizada
+IDEMPOTENCY_EM_CURSO = timedelta(seconds=int(os.getenv("IDEMPOTENCY_EM_CURSO_SEGUNDOS", "60")))
+
+ultima_limpeza = datetime.min
+
+
+def limparExpiradas(db, agora):
+    """Apaga as chaves mais antigas que o TTL (usa o índice em criado)"""
+    global ultima_limpeza
+    if agora - ultima_limpeza < LIMPEZA_INTERVALO:
+        return
+    ultima_limpeza = agora
+    db.query(IdempotencyKey).filter(IdempotencyKey.criado < agora - IDEMPOTENCY_TTL).delete()
+
+
+def reservar(chave, rota):
+    """
+    Reserva a chave para este pedido.
+    Devolve None se o pedido deve ser processado, ou o registo existente.
+    """
+    agora = datetime.utcnow()
+    with SessionLocal() as db:
+        limparExpiradas(db, agora)
+        registo = db.query(IdempotencyKey).filter_by(chave=chave, rota=rota).first()
+        if registo and registo.criado < agora - IDEMPOTENCY_TTL:
+            db.delete(registo)
+            db.flush()
+            registo = None
+        if registo and registo.status_code is None and registo.criado < agora - IDEMPOTENCY_EM_CURSO:
+            # só um dos pedidos que repetem a chave assume a reserva abandonada
+            assumidas = db.query(IdempotencyKey).filter(
+                IdempotencyKey.chave == chave,
+                IdempotencyKey.rota == rota,
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.criado == registo.criado,
+            ).update({"criado": agora}, synchronize_session=False)
+            db.commit()
+            return None if assumidas else {"status_code": None, "resposta": None}
+        if registo:
+            db.commit()
+            return {"status_code": registo.status_code, "resposta": registo.resposta}
+        db.add(IdempotencyKey(chave=chave, rota=rota, criado=agora))
+        try:
+            db.commit()
+        except IntegrityError:
+            # outro pedido com a mesma chave reservou-a entretanto
+            db.rollback()
+            return {"status_code": None, "resposta": None}
+        return None
+
+
+def concluir(chave, rota, status_code, resposta):
+    with SessionLocal() as db:
+        db.query(IdempotencyKey).filter_by(chave=chave, rota=rota).update(
+            {"status_code": status_code, "resposta": resposta}
+        )
+        db.commit()
+
+
+def libertar(chave, rota):
+    """Remove a reserva para que o cliente possa repetir depois de um erro do servidor"""
+    with SessionLocal() as db:
+        db.query(IdempotencyKey).filter_by(chave=chave, rota=rota).delete()
+        db.commit()
+
+
+async def idempotencyMiddleware(request, call_next):
+    chave = request.headers.get("Idempotency-Key")
+    if request.method != "POST" or not chave:
+        return await call_next(request)
+    if len(chave) > 100:
+        return JSONResponse(status_code=400, content={"detail": "Idempotency-Key demasiado longa"})
+
+    rota = request.url.path
+    registo = await run_in_threadpool(reservar, chave, rota)
+    if registo:
+        if registo["status_code"] is None:
+            return JSONResponse(status_code=409, content={"detail": "Pedido com esta Idempotency-Key ainda em curso"})
+        return Response(
+            content=registo["resposta"],
+            status_code=registo["status_code"],
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        await run_in_threadpool(libertar, chave, rota)
+        raise
+    if response.status_code >= 500:
+        await run_in_threadpool(libertar, chave, rota)
+        return response
+
+    corpo = b"".join([parte async for parte in response.body_iterator])
+    await run_in_threadpool(concluir, chave, rota, response.status_code, corpo.decode())
+    return Response(
+        content=corpo,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type,
+    )
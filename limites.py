@@ -0,0 +1,115 @@
+import math
+import os
+import threading
+import time
+from fastapi import HTTPException, Request
+
+# Limite de pedidos (token bucket por utilizador/IP) e controlo de admissão
+# para as rotas pesadas (/dina e listas sem paginação). Tudo em memória,
+# sem Redis: o serviço corre com um único worker.
+
+RATE_LIMIT_CAPACIDADE = float(os.getenv("RATE_LIMIT_CAPACIDADE", "60"))  # tokens por cliente
+RATE_LIMIT_TAXA = float(os.getenv("RATE_LIMIT_TAXA", "1"))  # tokens repostos por segundo
+MAX_PESADOS = int(os.getenv("MAX_PESADOS", "4"))  # pedidos pesados em simultâneo
+MAX_BUCKETS = 10000
+
+if MAX_PESADOS < 1:
+    raise ValueError("MAX_PESADOS tem de ser pelo menos 1")
+
+# Função que converte o token Bearer no utilizador; definida em main.py
+resolver_usuario = None
+
+
+class TokenBucket:
+    def __init__(self, capacidade=RATE_LIMIT_CAPACIDADE, taxa=RATE_LIMIT_TAXA):
+        if capacidade <= 0 or taxa <= 0:
+            raise ValueError("RATE_LIMIT_CAPACIDADE e RATE_LIMIT_TAXA têm de ser positivos")
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self.buckets = {}  # chave -> [tokens, último instante]
+        self.lock = threading.Lock()
+
+    def consumir(self, chave, custo=1, agora=None):
+        """Retira o custo do bucket; devolve 0 ou os segundos até haver tokens"""
+        agora = time.monotonic() if agora is None else agora
+        with self.lock:
+            # retirado e reinserido: o dict fica ordenado do uso mais antigo ao mais recente
+            tokens, ultimo = self.buckets.pop(chave, (self.capacidade, agora))
+            tokens = min(self.capacidade, tokens + (agora - ultimo) * self.taxa)
+            espera = 0 if tokens >= custo else (custo - tokens) / self.taxa
+            self.buckets[chave] = [tokens - custo if not espera else tokens, agora]
+            if len(self.buckets) > MAX_BUCKETS:
+                self.limpar(agora)
+            return espera
+
+    def limpar(self, agora):
+        # buckets que já estariam cheios são iguais a um cliente novo
+        cheio = self.capacidade / self.taxa
+        self.buckets = {
+            chave: valor for chave, valor in self.buckets.items() if agora - valor[1] < cheio
+        }
+        # todos ativos: esquece os menos recentes, que voltam com o bucket cheio
+        while len(self.buckets) > MAX_BUCKETS * 0.9:
+            del self.buckets[next(iter(self.buckets))]
+
+
+limiter = TokenBucket()
+semaforo = threading.BoundedSemaphore(MAX_PESADOS)
+metricas = {"permitidos": 0, "limitados": 0, "rejeitados_pesados": 0, "pesados_em_curso": 0}
+metricas_lock = threading.Lock()
+
+
+def contar(nome, valor=1):
+    with metricas_lock:
+        metricas[nome] += valor
+
+
+def chaveCliente(request: Request):
+    """Utilizador autenticado, se o token for válido; senão o IP"""
+    autorizacao = request.headers.get("Authorization", "")
+    if resolver_usuario and autorizacao.startswith("Bearer "):
+        usuario = resolver_usuario(autorizacao[7:])
+        if usuario:
+            return f"user:{usuario}"
+    return f"ip:{request.client.host if request.client else 'desconhecido'}"
+
+
+def limitar(custo=1, pesado=False):
+    """Dependência FastAPI: aplica o custo da rota e, se pesada, o semáforo"""
+    def dependencia(request: Request):
+        espera = limiter.consumir(chaveCliente(request), custo)
+        if espera:
+            contar("limitados")
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiados pedidos, tente mais tarde",
+                headers={"Retry-After": str(math.ceil(espera))},
+            )
+        if not pesado:
+            contar("permitidos")
+            yield
+            return
+        if not semaforo.acquire(blocking=False):
+            contar("rejeitados_pesados")
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado, tente mais tarde",
+                headers={"Retry-After": "1"},
+            )
+        contar("permitidos")
+        contar("pesados_em_curso")
+        try:
+            yield
+        finally:
+            contar("pesados_em_curso", -1)
+            semaforo.release()
+    return dependencia
+
+
+def exportarMetricas():
+    """Métricas no formato de texto do Prometheus"""
+    with metricas_lock:
+        valores = dict(metricas)
+    linhas = [f"hospital_rate_limit_{nome} {valor}" for nome, valor in valores.items()]
+    linhas.append(f"hospital_rate_limit_clientes {len(limiter.buckets)}")
+    return "\n".join(linhas) + "\n"
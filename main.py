@@ -1,20 +1,52 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from jose import jwt
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, date
+from typing import List
+from jose import jwt, JWTError
 import re
 from models.models import * 
 import uvicorn
 from sqlalchemy.orm import sessionmaker
 from controler import *
+from eventos import broadcaster, publicar
+from idempotencia import idempotencyMiddleware
+import limites
+from limites import limitar, exportarMetricas
+from analitica import snapshot, ANALITICA_SNAPSHOT
+from calendario import calendario, efectivo, CoberturaInsuficiente
+from organizacao import arvoreUnidades, contagemUnidades, queryEmployersUnidade, atribuirUnidade
+import asyncio
+from arquivo import prepararArquivo, arquivar, getHistorico, cicloArquivo, ARQUIVO_INTERVALO
+import backups
+import perfil
+from perfil import RotaPerfilada, ProfileMiddleware
+import csv
+import io
 import os
 
 
 from groq import Groq
 # Inicializar a aplicação FastAPI
 app = FastAPI()
+# Permite perfilar um pedido a pedido de um administrador (ver perfil.py)
+app.router.route_class = RotaPerfilada
+app.add_middleware(ProfileMiddleware)
+
+# Repetições de POST com Idempotency-Key devolvem a resposta guardada
+app.middleware("http")(idempotencyMiddleware)
+
+# Garante tabelas e índices no arranque
+@app.on_event("startup")
+async def startup():
+    create_base()
+    prepararArquivo()
+    if ARQUIVO_INTERVALO > 0:
+        asyncio.create_task(cicloArquivo())
+    backups.agendar()
 
 # Configurações de segurança e criptografia
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -34,6 +66,14 @@ def validate_contact(contact: str):
     if not re.match(r'^(87|86|84|85|82|83)\d{7}$', contact):
         raise HTTPException(status_code=400, detail="Número inválido. Deve começar com 87, 86, 84, 85, 82, ou 83 e ter 9 dígitos.")
 
+# Valida o parâmetro include= (relações a carregar nas listas)
+def validate_include(include: str = None):
+    try:
+        parseInclude(include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return include
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -60,6 +100,16 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+# Utilizador do token para o rate limit (None se o token for inválido)
+def usuario_do_token(token: str):
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+limites.resolver_usuario = usuario_do_token
+perfil.resolver_usuario = usuario_do_token
+
 # Dependência para obter o usuário atual a partir do token
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -100,35 +150,69 @@ def add_user(user: UserCreate, db: Session = Depends(get_db)):
 # Rota para adicionar um funcionário
 @app.post("/employers/")
 def add_employer(employer: EmployerCreate, db: Session = Depends(get_db)):
-    new_employer = Employer(
-        nome=employer.nome,
-        apelido=employer.apelido,
-        nascimento=employer.nascimento,
-        bi=employer.bi,
-        provincia=employer.provincia,
-        naturalidade=employer.naturalidade,
-        residencia=employer.residencia,
-        sexo=employer.sexo,
-        inicio_funcoes=employer.inicio_funcoes,
-        sector=employer.sector,
-        reparticao=employer.reparticao,
-        especialidade=employer.especialidade,
-        categoria=employer.categoria,
-        nuit=employer.nuit,
-        careira=employer.careira,
-        faixa_etaria=employer.faixa_etaria
-    )
+    # repetições do mesmo pedido são tratadas pelo Idempotency-Key;
+    # aqui um bi/nuit já registado é um conflito, nunca uma atualização
+    try:
+        dados = limparIdentificacao(employer.dict())
+        existente = procurarEmployer(db, dados)
+    except IdentificacaoEmConflito as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if existente:
+        raise HTTPException(status_code=409, detail=f"Já existe um funcionário com este bi ou nuit (id {existente.id})")
+    new_employer = Employer(**dados)
+    atribuirUnidade(db, new_employer)
     db.add(new_employer)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Já existe um funcionário com este bi ou nuit")
     db.refresh(new_employer)
+    publicar("employer.criado", {"id": new_employer.id, "nome": new_employer.nome, "apelido": new_employer.apelido, "sector": new_employer.sector, "status": new_employer.status})
     return new_employer
 
+# Importação em lote: funcionários com bi/nuit já registados são atualizados
+@app.post("/employers/lote", dependencies=[Depends(limitar(custo=5, pesado=True))])
+def add_employers_lote(employers: List[EmployerCreate], db: Session = Depends(get_db)):
+    resultado = []
+    for linha, employer in enumerate(employers):
+        try:
+            funcionario, criado = upsertEmployer(db, employer.dict())
+            db.flush()  # os seguintes do lote já encontram este
+        except IdentificacaoEmConflito:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=f"Lote recusado: linha {linha}, bi e nuit de funcionários diferentes")
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=f"Lote recusado: linha {linha}, bi ou nuit já registado")
+        resultado.append((funcionario, criado, employer.dict()))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Lote recusado: bi ou nuit já registado")
+    for funcionario, criado, dados in resultado:
+        if criado:
+            publicar("employer.criado", {"id": funcionario.id, "nome": funcionario.nome, "apelido": funcionario.apelido, "sector": funcionario.sector, "status": funcionario.status})
+        else:
+            publicar("employer.atualizado", {"id": funcionario.id, "campos": dados})
+    return {
+        "criados": [funcionario.id for funcionario, criado, _ in resultado if criado],
+        "atualizados": [funcionario.id for funcionario, criado, _ in resultado if not criado],
+    }
+
 # Rotas FastAPI
 @app.post('/add_ferias')
 def feria(feria: FeriaModel):
     try:
         f = addFerias(id=feria.funcionario_id, start=feria.data_inicio_ferias, end=feria.data_fim_ferias)
         return f
+    except CoberturaInsuficiente as e:
+        raise HTTPException(status_code=409, detail=f"Erro ao adicionar férias: {e}")
+    except FuncionarioNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Erro ao adicionar férias: {e}")
+    except (TransicaoInvalida, IntervaloInvalido) as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao adicionar férias: {e}")
     except HTTPException as e:
         raise HTTPException(status_code=e.status_code, detail=f"Erro ao adicionar férias: {e.detail}")
     except Exception as e:
@@ -140,6 +224,10 @@ def trasferido(transferencia: TransferenciaModal):
     try:
         f = addTransferencia(id=transferencia.funcionario_id, start=transferencia.data_transferido, lugar=transferencia.lugar_transferido)
         return f
+    except FuncionarioNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Erro ao adicionar trasferencia: {e}")
+    except TransicaoInvalida as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao adicionar trasferencia: {e}")
     except HTTPException as e:
         raise HTTPException(status_code=e.status_code, detail=f"Erro ao adicionar trasferencia: {e.detail}")
     except Exception as e:
@@ -150,6 +238,10 @@ def reforma(reforma: ReformaModal):
     try:
         r = addReforma(id=reforma.funcionario_id, data=reforma.data_reforma, idade=reforma.idade_reforma)
         return r
+    except FuncionarioNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Erro ao adicionar reforma: {e}")
+    except TransicaoInvalida as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao adicionar reforma: {e}")
     except HTTPException as e:
         raise HTTPException(status_code=e.status_code, detail=f"Erro ao adicionar reforma: {e.detail}")
     except Exception as e:
@@ -160,6 +252,10 @@ def suspenso(suspenso: SuspensoModal):
     try:
         s = addSuspenso(id=suspenso.funcionario_id, data=suspenso.data_suspenso, motivo=suspenso.motivo)
         return s
+    except FuncionarioNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Erro ao adicionar suspenso: {e}")
+    except TransicaoInvalida as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao adicionar suspenso: {e}")
     except HTTPException as e:
         raise HTTPException(status_code=e.status_code, detail=f"Erro ao adicionar suspenso: {e.detail}")
     except Exception as e:
@@ -169,78 +265,88 @@ def suspenso(suspenso: SuspensoModal):
 def falecido(falecido: FalecidoModal):
     try:
         return addFalecido(id=falecido.funcionario_id, data=falecido.data_falecimento, idade=falecido.idade)
+    except FuncionarioNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=f"Erro ao adicionar falecido: {e}")
+    except TransicaoInvalida as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao adicionar falecido: {e}")
     except HTTPException as e:
         raise HTTPException(status_code=e.status_code, detail=f"Erro ao adicionar falecido: {e.detail}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro inesperado: {str(e)}")
 
-@app.get('/trasferido')
+@app.get('/trasferido', dependencies=[Depends(limitar(custo=2, pesado=True))])
 def get_trasferido():
     return getTransferencia()
 
 
-@app.get('/suspenso')
+@app.get('/suspenso', dependencies=[Depends(limitar(custo=2, pesado=True))])
 def get_suspenso():
     return getSuspenso()
 
-@app.get('/falecido')
+@app.get('/falecido', dependencies=[Depends(limitar(custo=2, pesado=True))])
 def get_falecido():
     return getFalecido()
 
-@app.get('/ferias/')
+@app.get('/ferias/', dependencies=[Depends(limitar(custo=2, pesado=True))])
 def get_ferias(search=""):
     return getFerias(search)
 
 
-@app.get("/removido/")
-def remov(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersRemovido()
+# Ausentes por dia num sector (índice de férias em memória);
+# /ferias/calendar é o caminho pedido originalmente, mantido como alias
+@app.get('/ferias/calendario')
+@app.get('/ferias/calendar')
+def get_ferias_calendario(sector: str, de: date = Query(..., alias="from"), ate: date = Query(..., alias="to"), db: Session = Depends(get_db)):
+    if ate < de or (ate - de).days > 366:
+        raise HTTPException(status_code=400, detail="Intervalo inválido: 'to' deve ser posterior a 'from' e no máximo um ano depois")
+    return {"sector": sector, "efectivo": efectivo(db, sector), "dias": calendario.dias(db, sector, de, ate)}
 
+@app.get("/removido/", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def remov(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersRemovido(include)
 
 
-@app.get("/emp/transferidos")
-def tras(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersTransferido()
 
-@app.get("/emp/licencas")
-def lice(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersLICENCA(search)
+@app.get("/emp/transferidos", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def tras(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersTransferido(include)
 
-@app.get("/emp/suspensos")
-def susp(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersSuspensed()
+@app.get("/emp/licencas", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def lice(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersLICENCA(search, include)
 
+@app.get("/emp/suspensos", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def susp(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersSuspensed(include)
 
 
 
-@app.get("/emp/reformados")
-def refo(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersReforma()
 
-@app.get("/emp/falecidos")
-def fal(search: str = None, db: Session = Depends(get_db)):
-    return getEmployersDeath()
+@app.get("/emp/reformados", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def refo(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersReforma(include)
 
-@app.get("/employers/")
-def funcionarios(search: str = None, db: Session = Depends(get_db)):
-    return getEmployers()
+@app.get("/emp/falecidos", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def fal(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersDeath(include)
 
-@app.get("/employers/passados")
-def funcionarios_passados(search: str = None, db: Session = Depends(get_db)):
-    employers = db.query(Employer).filter(
-    or_(
-        
-        Employer.status == "TRASFERIDO",
-        Employer.status == "SUSPENSO",
-        Employer.status == "FALECIDO",
-        
-    )
-).all()
-    return employers
+@app.get("/employers/", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def funcionarios(search: str = None, include: str = Depends(validate_include)):
+    return getEmployers(include)
+
+@app.get("/employers/passados", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def funcionarios_passados(search: str = None, include: str = Depends(validate_include)):
+    return getEmployersPassados(include)
 
 @app.get("/employer/{id}")
 def funcionarios(id:int, db: Session = Depends(get_db)):
-    return getById(id)
+    # funcionários arquivados continuam acessíveis pela vista de histórico
+    return getById(id) or getHistorico(id)
+
+# Move já para o arquivo os inativos antigos (normalmente corre agendado)
+@app.post("/admin/arquivo")
+def admin_arquivo(anos: float = None, current_user: User = Depends(get_current_user)):
+    return {"arquivados": arquivar() if anos is None else arquivar(anos)}
 
 #ROTAS PARA ESTATUS
 @app.post("/users/")
@@ -257,35 +363,103 @@ def add_user(user: UserCreate, db: Session = Depends(get_db)):
     return new_user
 
 
-# Rota para listar funcionários por setor
-@app.get("/employers/sector/{sector}")
-def read_employers_by_sector(sector: str, db: Session = Depends(get_db)):
-    return db.query(Employer).filter(Employer.sector == sector).all()
+# Consulta combinada: filtros de igualdade/IN, intervalos, ordenação e paginação
+@app.post("/employers/query", dependencies=[Depends(limitar(custo=1))])
+def query_employers(consulta: EmployerQuery):
+    if consulta.limit < 1 or consulta.limit > 500 or consulta.offset < 0:
+        raise HTTPException(status_code=400, detail="limit deve estar entre 1 e 500 e offset não pode ser negativo")
+    try:
+        return queryEmployersFiltro(
+            igual=consulta.igual,
+            intervalo={coluna: limites.dict() for coluna, limites in consulta.intervalo.items()},
+            nome=consulta.nome,
+            ordenar=consulta.ordenar,
+            include=consulta.include,
+            limit=consulta.limit,
+            offset=consulta.offset,
+            total=consulta.total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Rota para listar funcionários por setor (pela árvore de unidades: ignora
+# maiúsculas e espaços repetidos no nome)
+@app.get("/employers/sector/{sector}", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def read_employers_by_sector(sector: str):
+    return getEmployerBySector(sector)
+
+# Funcionários de uma repartição, incluindo os dos seus sectores
+@app.get("/employers/reparticao/{reparticao}", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def read_employers_by_reparticao(reparticao: str):
+    return getEmployerByReparticao(reparticao)
 
 
-@app.get('/getbysearch/')
+@app.get('/getbysearch/', dependencies=[Depends(limitar(custo=2, pesado=True))])
 def searcher(name:str,db: Session = Depends(get_db)):
     return db.query(Employer).filter(Employer.nome.like(f'%{name}%')).all()
 
 @app.get("/employers/sectors")
 def read_employers_by_sectors():
-    
+    if ANALITICA_SNAPSHOT:
+        contagem = snapshot.contar("sector")
+        return {setor: contagem.get(setor, 0) for setor in SETORES}
     return getLen()
 
+# Análises sobre o snapshot colunar em memória
+def filtros_analitica(status: str = None, sector: str = None, sexo: str = None, provincia: str = None, reparticao: str = None):
+    # valores separados por vírgula viram uma lista (IN)
+    filtros = {"status": status, "sector": sector, "sexo": sexo, "provincia": provincia, "reparticao": reparticao}
+    return {coluna: valor.split(",") for coluna, valor in filtros.items() if valor}
+
+@app.get("/analitica/contagem/{coluna}")
+def analitica_contagem(coluna: str, filtros: dict = Depends(filtros_analitica)):
+    try:
+        return snapshot.contar(coluna, filtros)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analitica/idades")
+def analitica_idades(largura: int = 10, filtros: dict = Depends(filtros_analitica)):
+    if largura < 1:
+        raise HTTPException(status_code=400, detail="largura deve ser positiva")
+    return snapshot.faixasEtarias(largura, filtros)
+
+@app.get("/analitica/memoria")
+def analitica_memoria():
+    return snapshot.memoria()
 
 
+
+# Árvore de unidades orgânicas com o total de funcionários de cada unidade
+@app.get("/unidades")
+def read_unidades(raiz: int = None, activos: bool = False, db: Session = Depends(get_db)):
+    return arvoreUnidades(db, raiz, STATUS_ACTIVOS if activos else None)
+
+# Funcionários de uma unidade e das suas subunidades
+@app.get("/unidades/{id_unidade}/employers", dependencies=[Depends(limitar(custo=2, pesado=True))])
+def read_employers_by_unidade(id_unidade: int, activos: bool = False, db: Session = Depends(get_db)):
+    query = queryEmployersUnidade(db, [id_unidade])
+    if activos:
+        query = query.filter(Employer.status.in_(STATUS_ACTIVOS))
+    return query.all()
+
+# Total de funcionários por unidade dentro da subárvore (id da unidade -> total)
+@app.get("/unidades/{id_unidade}/contagem")
+def read_contagem_unidade(id_unidade: int, activos: bool = False, db: Session = Depends(get_db)):
+    return contagemUnidades(db, id_unidade, STATUS_ACTIVOS if activos else None)
+
 # Rota para listar funcionários por naturalidade
-@app.get("/employers/naturality/{naturality}")
+@app.get("/employers/naturality/{naturality}", dependencies=[Depends(limitar(custo=2, pesado=True))])
 def read_employers_by_naturality(naturality: str, db: Session = Depends(get_db)):
     return db.query(Employer).filter(Employer.naturalidade == naturality).all()
 
 # Rota para listar funcionários por província
-@app.get("/employers/province/{province}")
+@app.get("/employers/province/{province}", dependencies=[Depends(limitar(custo=2, pesado=True))])
 def read_employers_by_province(province: str, db: Session = Depends(get_db)):
     return db.query(Employer).filter(Employer.provincia == province).all()
 
 # Rota para listar funcionários por nome
-@app.get("/employers/name/{name}")
+@app.get("/employers/name/{name}", dependencies=[Depends(limitar(custo=2, pesado=True))])
 def read_employers_by_name(name: str, surename: str = None, db: Session = Depends(get_db)):
     if surename:
         return db.query(Employer).filter_by(nome=name, apelido=surename).all()
@@ -293,12 +467,12 @@ def read_employers_by_name(name: str, surename: str = None, db: Session = Depend
         return db.query(Employer).filter_by(nome=name).all()
 
 # Rota para listar funcionários por gênero
-@app.get("/employers/genre/{genre}")
+@app.get("/employers/genre/{genre}", dependencies=[Depends(limitar(custo=2, pesado=True))])
 def read_employers_by_genre(genre: str, db: Session = Depends(get_db)):
     return db.query(Employer).filter(Employer.sexo == genre).all()
 
 # Rota para listar funcionários por ano de início
-@app.get("/employers/year/{year}")
+@app.get("/employers/year/{year}", dependencies=[Depends(limitar(custo=2, pesado=True))])
 def read_employers_by_year(year: int, db: Session = Depends(get_db)):
     return db.query(Employer).filter(Employer.ano_inicio == year).all()
 
@@ -314,30 +488,128 @@ def update_employer(employer_id: int, employer_update: EmployerUpdate, db: Sessi
         raise HTTPException(status_code=404, detail="Employer not found")
     
     # Atualiza os campos conforme fornecido no payload
-    update_data = employer_update.dict(exclude_unset=True)  # Exclui campos que não foram fornecidos
+    update_data = limparIdentificacao(employer_update.dict(exclude_unset=True))  # Exclui campos que não foram fornecidos
+    anterior = employer.status
+    novo_status = update_data.pop("status", None)
     
     for key, value in update_data.items():
         setattr(employer, key, value)  # Define os novos valores
+    if "sector" in update_data or "reparticao" in update_data:
+        atribuirUnidade(db, employer)
     
-    db.commit()
+    # O status só muda pelo UPDATE condicional (validado na base de dados)
+    if novo_status and novo_status != anterior:
+        db.flush()
+        if not transicionar(db, [employer_id], novo_status):
+            db.rollback()
+            raise HTTPException(status_code=400, detail=f"Transição de status inválida: {anterior} -> {novo_status}")
+        update_data["status"] = novo_status
+    
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Já existe um funcionário com este bi ou nuit")
     db.refresh(employer)  # Atualiza o objeto com os dados mais recentes do banco
+    publicar("employer.atualizado", {"id": employer.id, "campos": update_data})
+    publicarStatus(employer.id, anterior, employer.status)
     
     return employer
 
 
 
 
+# Mudança de status em lote: um único UPDATE condicional para todos os ids
+@app.post("/employers/status")
+def update_status_lote(lote: StatusLote):
+    if lote.status not in {destino for destinos in STATUS_TRANSITIONS.values() for destino in destinos}:
+        raise HTTPException(status_code=400, detail=f"Status desconhecido: {lote.status}")
+    return setStatus(lote.ids, lote.status)
+
 # Rota para deletar um funcionário
 @app.delete("/employers/{id_employer}")
 def delete_employer(id_employer: int, db: Session = Depends(get_db)):
     employer = db.query(Employer).filter(Employer.id == id_employer).first()
     if not employer:
         raise HTTPException(status_code=404, detail="Employer not found")
-    employer.status = "Removido"
-    employer.data_remocao = datetime.utcnow()
-    db.commit()
+    anterior = employer.status
+    if anterior != "Removido":
+        if not transicionar(db, [id_employer], "Removido"):
+            raise HTTPException(status_code=400, detail=f"Transição de status inválida: {anterior} -> Removido")
+        db.commit()
+        publicarStatus(id_employer, anterior, "Removido")
     return {"message": "Employer status updated to 'Removido'"}
 
+# Snapshots da base (API de backup do SQLite) e réplica de leitura
+@app.get("/admin/snapshots")
+def admin_listar_snapshots(current_user: User = Depends(get_current_user)):
+    return {"snapshots": backups.listarSnapshots(), "replica_atualizada": replicaAtualizada()}
+
+@app.post("/admin/snapshots")
+def admin_criar_snapshot(replica: bool = False, current_user: User = Depends(get_current_user)):
+    if replica:
+        return {"replica": backups.atualizarReplica()}
+    return {"snapshot": backups.fazerSnapshot()}
+
+# Exportação do quadro em CSV, lida da réplica
+@app.get("/export/employers.csv", dependencies=[Depends(limitar(custo=5, pesado=True))])
+def export_employers(db: Session = Depends(get_replica_db)):
+    colunas = [coluna.name for coluna in Employer.__table__.columns]
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(colunas)
+    for linha in db.query(*[getattr(Employer, coluna) for coluna in colunas]).yield_per(1000):
+        escritor.writerow(linha)
+    return PlainTextResponse(
+        saida.getvalue(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=employers.csv"},
+    )
+
+# Relatórios de perfil (pedidos feitos com X-Profile: 1 ou ?profile=1)
+def get_profile_admin(current_user: User = Depends(get_current_user)):
+    if not perfil.autorizado(current_user.contact):
+        raise HTTPException(status_code=403, detail="Perfil só disponível para administradores")
+    return current_user
+
+@app.get("/admin/profiles")
+def admin_listar_perfis(current_user: User = Depends(get_profile_admin)):
+    return [{"id": r.id, "rota": f"{r.metodo} {r.caminho}", "ms": r.ms, "sql": len(r.sql)} for r in perfil.relatorios.values()]
+
+@app.get("/admin/profiles/{id_perfil}")
+def admin_perfil(id_perfil: str, formato: str = "json", current_user: User = Depends(get_profile_admin)):
+    relatorio = perfil.relatorios.get(id_perfil)
+    if not relatorio:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if formato == "texto":
+        return PlainTextResponse(relatorio.texto())
+    if formato == "prof":
+        if not relatorio.perfilado:
+            raise HTTPException(status_code=404, detail="Sem dados do profiler para este pedido")
+        return Response(
+            relatorio.binario(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={id_perfil}.prof"},
+        )
+    return relatorio.resumo()
+
+# Métricas do rate limit e do controlo de admissão (formato Prometheus)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return exportarMetricas()
+
+# Feed de alterações para os dashboards (Server-Sent Events)
+# Para retomar, o cliente envia Last-Event-ID (o navegador faz isso sozinho) ou ?desde=
+@app.get("/events")
+def events(desde: int = None, last_event_id: str = Header(None)):
+    if desde is None and last_event_id and last_event_id.isdigit():
+        desde = int(last_event_id)
+    return StreamingResponse(
+        broadcaster.stream(desde),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 client = Groq(api_key=os.getenv("API_KEY"))
 
 # Classe para a entrada de texto
@@ -371,8 +643,8 @@ def employer_to_dict(employer):
 
 message_history = []
 
-@app.post('/dina')
-def dina(text_input: TextInput, db: Session = Depends(get_db)):
+@app.post('/dina', dependencies=[Depends(limitar(custo=10, pesado=True))])
+def dina(text_input: TextInput, db: Session = Depends(get_replica_db)):
     users = db.query(Employer).all()
     text = text_input.text
     
@@ -1,12 +1,15 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, create_engine
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Index, Table, create_engine, func
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Dict, Union
 
 # Instância Base para os modelos
 Base = declarative_base()
 
+# Status do quadro ativo (lista principal de funcionários)
+STATUS_ACTIVOS = ["ACTIVO", "DISPENSA", "LICENCA"]
+
 # Modelo para usuário (login através de telefone e senha)
 class User(Base):
     __tablename__ = "users"
@@ -15,6 +18,52 @@ class User(Base):
     contact = Column(String(30))
     password = Column(String(64))
 
+# Respostas guardadas por Idempotency-Key (repetições de POST)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    chave = Column(String(100), primary_key=True)
+    rota = Column(String(100), primary_key=True)
+    status_code = Column(Integer, nullable=True)  # None enquanto o pedido está em curso
+    resposta = Column(Text, nullable=True)
+    criado = Column(DateTime, default=datetime.utcnow, index=True)
+
+# bi/nuit repetidos encontrados ao criar os índices únicos (ver controler.deduplicarIdentificacao)
+class IdentificacaoDuplicada(Base):
+    __tablename__ = "identificacoes_duplicadas"
+    id = Column(Integer, primary_key=True)
+    funcionario_id = Column(Integer, index=True)
+    campo = Column(String(10))  # "bi" ou "nuit"
+    valor = Column(String(50))
+    detectado = Column(DateTime, default=datetime.utcnow)
+
+# Transições de status permitidas (preenchida a partir de controler.STATUS_TRANSITIONS)
+class StatusTransition(Base):
+    __tablename__ = "status_transitions"
+    origem = Column(String(50), primary_key=True)
+    destino = Column(String(50), primary_key=True, index=True)
+
+# Unidades orgânicas (hospital > repartição > sector)
+class UnidadeOrganica(Base):
+    __tablename__ = "unidades"
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(200))
+    chave = Column(String(200), index=True)  # nome normalizado, para não duplicar
+    tipo = Column(String(30))  # "hospital", "reparticao" ou "sector"
+    pai_id = Column(Integer, ForeignKey('unidades.id'), nullable=True)
+
+# Uma unidade por (tipo, pai, chave). No índice único o SQLite não compara
+# NULL com NULL, por isso a raiz (pai_id NULL) entra como 0, que não é um id
+Index("ix_unidades_unica", UnidadeOrganica.tipo, func.coalesce(UnidadeOrganica.pai_id, 0),
+      UnidadeOrganica.chave, unique=True)
+
+# Tabela de fecho: um par (ancestral, descendente) para cada caminho da árvore,
+# incluindo a própria unidade com profundidade 0
+class UnidadeFechamento(Base):
+    __tablename__ = "unidades_fechamento"
+    ancestral_id = Column(Integer, ForeignKey('unidades.id'), primary_key=True)
+    descendente_id = Column(Integer, ForeignKey('unidades.id'), primary_key=True, index=True)
+    profundidade = Column(Integer, nullable=False)
+
 # Modelo para férias usando Pydantic
 class FeriaModel(BaseModel):
     funcionario_id: str
@@ -45,6 +94,7 @@ class SuspensoModal(BaseModel):
 # Modelo para Férias
 class Feria(Base):
     __tablename__ = "ferias"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     funcionario_id = Column(Integer, ForeignKey('employers.id'), nullable=False)
     data_inicio_ferias = Column(DateTime, nullable=True)
@@ -54,6 +104,7 @@ class Feria(Base):
 # Modelo para Transferência
 class Transferencia(Base):
     __tablename__ = "transferencias"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     funcionario_id = Column(Integer, ForeignKey('employers.id'), nullable=False)
     data_transferido = Column(DateTime, nullable=True)
@@ -63,6 +114,7 @@ class Transferencia(Base):
 # Modelo para Reforma
 class Reforma(Base):
     __tablename__ = "reformas"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     funcionario_id = Column(Integer, ForeignKey('employers.id'), nullable=False)
     data_reforma = Column(DateTime, nullable=True)
@@ -72,6 +124,7 @@ class Reforma(Base):
 # Modelo para Falecido
 class Falecido(Base):
     __tablename__ = "falecimentos"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     funcionario_id = Column(Integer, ForeignKey('employers.id'), nullable=False)
     data_falecimento = Column(DateTime, nullable=True)
@@ -81,6 +134,7 @@ class Falecido(Base):
 # Modelo para Suspenso
 class Suspenso(Base):
     __tablename__ = "suspensos"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     funcionario_id = Column(Integer, ForeignKey('employers.id'), nullable=False)
     data_suspenso = Column(DateTime, nullable=True)
@@ -90,25 +144,29 @@ class Suspenso(Base):
 # Modelo para Empregador
 class Employer(Base):
     __tablename__ = "employers"
+    # ids nunca reutilizados: os arquivados continuam nas vistas de histórico
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     nome = Column(String(50))
     apelido = Column(String(50))
     nascimento = Column(DateTime)
-    bi = Column(String(50))
-    provincia = Column(String(50))
-    naturalidade = Column(String(50))
+    bi = Column(String(50), unique=True, index=True)
+    provincia = Column(String(50), index=True)
+    naturalidade = Column(String(50), index=True)
     residencia = Column(String(50))
-    sexo = Column(String(50))
+    sexo = Column(String(50), index=True)
     inicio_funcoes = Column(DateTime)
-    ano_inicio = Column(Integer, default=2020)
-    sector = Column(String(200))
-    reparticao = Column(String(100))
+    ano_inicio = Column(Integer, default=2020, index=True)
+    sector = Column(String(200), index=True)
+    reparticao = Column(String(100), index=True)
     especialidade = Column(String(100))
     categoria = Column(String(100))
-    nuit = Column(String(50))
-    status = Column(String(50), default="ACTIVO")
+    nuit = Column(String(50), unique=True, index=True)
+    status = Column(String(50), default="ACTIVO")  # indexado só no quadro ativo (ver abaixo)
     careira = Column(String(200))
     faixa_etaria = Column(String(50)) 
+    status_alterado = Column(DateTime, nullable=True)  # usado pelo arquivo de inativos
+    unidade_id = Column(Integer, ForeignKey('unidades.id'), nullable=True, index=True)
 
     ferias = relationship("Feria", back_populates="employer")
     transferencias = relationship("Transferencia", back_populates="employer")
@@ -129,6 +187,45 @@ class Employer(Base):
             return (datetime.utcnow() - self.data_dispensa).days
         return 0
 
+# Índices parciais: um só com o quadro ativo (não cresce com os inativos) e
+# outro com os restantes status. Não há índice simples em status: o
+# planeador preferia-o sempre aos parciais (ver controler.queryEmployers).
+Index("ix_employers_quadro_activo", Employer.status, Employer.sector, Employer.nome,
+      sqlite_where=Employer.status.in_(STATUS_ACTIVOS))
+Index("ix_employers_inactivos", Employer.status, sqlite_where=Employer.status.not_in(STATUS_ACTIVOS))
+
+# Vistas <tabela>_historico (quadro atual + arquivo, criadas por arquivo.py),
+# só de leitura. Ficam noutro metadata para create_all não as criar como tabelas.
+HistoricoBase = declarative_base()
+
+def vistaHistorico(modelo):
+    colunas = [Column(coluna.name, coluna.type, primary_key=coluna.primary_key) for coluna in modelo.__table__.columns]
+    return Table(f"{modelo.__tablename__}_historico", HistoricoBase.metadata, *colunas, Column("arquivado_em", DateTime))
+
+class FeriaHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Feria)
+
+class TransferenciaHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Transferencia)
+
+class ReformaHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Reforma)
+
+class FalecidoHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Falecido)
+
+class SuspensoHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Suspenso)
+
+class EmployerHistorico(HistoricoBase):
+    __table__ = vistaHistorico(Employer)
+
+    ferias = relationship("FeriaHistorico", primaryjoin="foreign(FeriaHistorico.funcionario_id) == EmployerHistorico.id", viewonly=True)
+    transferencias = relationship("TransferenciaHistorico", primaryjoin="foreign(TransferenciaHistorico.funcionario_id) == EmployerHistorico.id", viewonly=True)
+    reformas = relationship("ReformaHistorico", primaryjoin="foreign(ReformaHistorico.funcionario_id) == EmployerHistorico.id", viewonly=True)
+    falecimentos = relationship("FalecidoHistorico", primaryjoin="foreign(FalecidoHistorico.funcionario_id) == EmployerHistorico.id", viewonly=True)
+    suspensos = relationship("SuspensoHistorico", primaryjoin="foreign(SuspensoHistorico.funcionario_id) == EmployerHistorico.id", viewonly=True)
+
 class EmployerCreate(BaseModel):
     nome: str
     apelido: str
@@ -175,6 +272,26 @@ class EmployerUpdateStatus(BaseModel):
     razao_remocao: Optional[str] = None  # Razão da remoção, pode ser opcional
     nova_localizacao: Optional[str] = None  # Nova localização se o funcionário for transferido, pode ser opcional
 
+# Modelos para a consulta combinada de funcionários (/employers/query)
+class IntervaloModel(BaseModel):
+    de: Optional[Union[datetime, int]] = None
+    ate: Optional[Union[datetime, int]] = None
+
+class EmployerQuery(BaseModel):
+    igual: Dict[str, Union[str, int, List[Union[str, int]]]] = {}  # lista = IN
+    intervalo: Dict[str, IntervaloModel] = {}  # nascimento, inicio_funcoes, ano_inicio
+    nome: Optional[str] = None  # pesquisa parcial no nome
+    ordenar: List[str] = []  # ex: ["sector", "-nascimento"]
+    include: List[str] = []
+    limit: int = 50
+    offset: int = 0
+    total: bool = False
+
+# Mudança de status em lote
+class StatusLote(BaseModel):
+    ids: List[int]
+    status: str
+
 # Modelo Pydantic para criação de usuário
 class UserCreate(BaseModel):
     name: str
@@ -0,0 +1,133 @@
+from sqlalchemy import func, select, insert, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.models import Employer, UnidadeOrganica, UnidadeFechamento
+
+# Árvore de unidades orgânicas (hospital > repartição > sector) com tabela de
+# fecho: as consultas de subárvore e as contagens agregadas são um único JOIN
+# indexado com unidades_fechamento, sem recursão nem contas no cliente.
+# Os campos de texto sector/reparticao dos funcionários continuam a existir;
+# unidade_id é mantido a partir deles.
+
+HOSPITAL = "Hospital Provincial de Lichinga"
+
+
+def normalizar(nome):
+    """Chave de deduplicação: sem espaços repetidos e sem distinguir maiúsculas"""
+    return " ".join((nome or "").split()).casefold()
+
+
+def criarUnidade(db, nome, tipo, pai_id=None):
+    chave = normalizar(nome)
+    id = db.execute(
+        sqlite_insert(UnidadeOrganica)
+        .values(nome=" ".join(nome.split()), chave=chave, tipo=tipo, pai_id=pai_id)
+        .on_conflict_do_nothing()
+        .returning(UnidadeOrganica.id)
+    ).scalar()
+    if id is None:
+        # outro pedido criou-a entre a procura e o INSERT (ix_unidades_unica)
+        return db.query(UnidadeOrganica).filter_by(chave=chave, tipo=tipo, pai_id=pai_id).one()
+    # a nova unidade herda todos os ancestrais do pai, um nível abaixo
+    db.execute(insert(UnidadeFechamento).values(
+        ancestral_id=id, descendente_id=id, profundidade=0
+    ))
+    if pai_id is not None:
+        db.execute(insert(UnidadeFechamento).from_select(
+            ["ancestral_id", "descendente_id", "profundidade"],
+            select(
+                UnidadeFechamento.ancestral_id,
+                literal(id),
+                UnidadeFechamento.profundidade + 1,
+            ).where(UnidadeFechamento.descendente_id == pai_id),
+        ))
+    return db.get(UnidadeOrganica, id)
+
+
+def obterUnidade(db, nome, tipo, pai_id=None):
+    """Devolve a unidade com este nome (normalizado) sob o pai, criando-a se faltar"""
+    unidade = db.query(UnidadeOrganica).filter_by(chave=normalizar(nome), tipo=tipo, pai_id=pai_id).first()
+    return unidade or criarUnidade(db, nome, tipo, pai_id)
+
+
+def unidadePara(db, reparticao, sector):
+    """Unidade mais específica para o par repartição/sector de um funcionário"""
+    unidade = obterUnidade(db, HOSPITAL, "hospital")
+    if normalizar(reparticao):
+        unidade = obterUnidade(db, reparticao, "reparticao", unidade.id)
+    if normalizar(sector):
+        unidade = obterUnidade(db, sector, "sector", unidade.id)
+    return unidade
+
+
+def atribuirUnidade(db, funcionario):
+    funcionario.unidade_id = unidadePara(db, funcionario.reparticao, funcionario.sector).id
+
+
+def migrarUnidades(db):
+    """
+    Cria as unidades a partir dos textos existentes (deduplicados) e liga os
+    funcionários ainda sem unidade. Pode correr várias vezes.
+    """
+    pares = db.query(Employer.reparticao, Employer.sector).filter(Employer.unidade_id.is_(None)).distinct().all()
+    cache = {}
+    for reparticao, sector in pares:
+        chave = (normalizar(reparticao), normalizar(sector))
+        if chave not in cache:
+            cache[chave] = unidadePara(db, reparticao, sector).id
+        # "== None" é traduzido para IS NULL
+        db.query(Employer).filter(
+            Employer.unidade_id.is_(None),
+            Employer.reparticao == reparticao,
+            Employer.sector == sector,
+        ).update({"unidade_id": cache[chave]}, synchronize_session=False)
+    db.commit()
+    return len(pares)
+
+
+def unidadesPorNome(db, nome, tipo):
+    return [id for (id,) in db.query(UnidadeOrganica.id).filter_by(chave=normalizar(nome), tipo=tipo)]
+
+
+def queryEmployersUnidade(db, unidades):
+    """Funcionários de uma ou mais unidades e de todas as suas subunidades"""
+    return db.query(Employer).join(
+        UnidadeFechamento, UnidadeFechamento.descendente_id == Employer.unidade_id
+    ).filter(UnidadeFechamento.ancestral_id.in_(list(unidades)))
+
+
+def contagemUnidades(db, raiz=None, status=None):
+    """
+    Número de funcionários em cada unidade, somando as subunidades,
+    numa única consulta agrupada pela tabela de fecho.
+    """
+    query = db.query(UnidadeFechamento.ancestral_id, func.count(Employer.id)).join(
+        Employer, Employer.unidade_id == UnidadeFechamento.descendente_id
+    )
+    if status:
+        query = query.filter(Employer.status.in_(status))
+    if raiz is not None:
+        subarvore = select(UnidadeFechamento.descendente_id).where(UnidadeFechamento.ancestral_id == raiz)
+        query = query.filter(UnidadeFechamento.ancestral_id.in_(subarvore))
+    return dict(query.group_by(UnidadeFechamento.ancestral_id).all())
+
+
+def arvoreUnidades(db, raiz=None, status=None):
+    """Árvore de unidades com o total de funcionários de cada uma"""
+    contagem = contagemUnidades(db, raiz, status)
+    query = db.query(UnidadeOrganica)
+    if raiz is not None:
+        query = query.join(UnidadeFechamento, UnidadeFechamento.descendente_id == UnidadeOrganica.id).filter(
+            UnidadeFechamento.ancestral_id == raiz
+        )
+    nos = {
+        unidade.id: {"id": unidade.id, "nome": unidade.nome, "tipo": unidade.tipo, "pai_id": unidade.pai_id,
+                     "funcionarios": contagem.get(unidade.id, 0), "subunidades": []}
+        for unidade in query
+    }
+    raizes = []
+    for no in nos.values():
+        if no["pai_id"] in nos:
+            nos[no["pai_id"]]["subunidades"].append(no)
+        else:
+            raizes.append(no)
+    return raizes
@@ -0,0 +1,247 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import wraps
+from urllib.parse import parse_qsl
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from controler import engine
+
+# Perfil de um único pedido, ativado por um administrador com o cabeçalho
+# X-Profile: 1 ou ?profile=1. O endpoint corre sob cProfile e cada instrução
+# SQL é registada com o tempo e o EXPLAIN QUERY PLAN. Sem o interruptor, o
+# custo é procurar o cabeçalho no scope e uma leitura de ContextVar no
+# endpoint: os listeners do SQLAlchemy só estão instalados enquanto há
+# pedidos a ser perfilados. Só os contactos em PROFILE_ADMINS podem perfilar
+# e ler os relatórios, que incluem os parâmetros SQL (bi, nuit, ...).
+
+PROFILE_ADMINS = {contacto for contacto in os.getenv("PROFILE_ADMINS", "").split(",") if contacto}
+MAX_RELATORIOS = 50
+
+# Função que converte o token Bearer no utilizador; definida em main.py
+resolver_usuario = None
+
+relatorio_atual = ContextVar("relatorio_atual", default=None)
+relatorios = OrderedDict()
+lock = threading.Lock()
+ativos = 0
+
+
+class Relatorio:
+    def __init__(self, metodo, caminho, usuario):
+        self.id = uuid.uuid4().hex
+        self.metodo = metodo
+        self.caminho = caminho
+        self.usuario = usuario
+        self.profiler = cProfile.Profile()
+        self.sql = []
+        self.ms = None
+        self.perfilado = False  # o endpoint chegou a correr sob o profiler
+
+    def resumo(self):
+        funcoes = []
+        if self.perfilado:
+            stats = pstats.Stats(self.profiler)
+            funcoes = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:30]
+        return {
+            "id": self.id,
+            "rota": f"{self.metodo} {self.caminho}",
+            "usuario": self.usuario,
+            "ms": self.ms,
+            "sql": self.sql,
+            "funcoes": [
+                {
+                    "funcao": f"{ficheiro}:{linha}({nome})",
+                    "chamadas": chamadas,
+                    "tempo_proprio_ms": round(proprio * 1000, 3),
+                    "tempo_acumulado_ms": round(acumulado * 1000, 3),
+                }
+                for (ficheiro, linha, nome), (_, chamadas, proprio, acumulado, _) in funcoes
+            ],
+        }
+
+    def texto(self):
+        if not self.perfilado:
+            return "Sem dados do profiler (o endpoint não chegou a correr)\n"
+        saida = io.StringIO()
+        pstats.Stats(self.profiler, stream=saida).sort_stats("cumulative").print_stats(40)
+        return saida.getvalue()
+
+    def binario(self):
+        """Mesmo formato de Profile.dump_stats (snakeviz, pstats.Stats)"""
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+def antesSQL(conn, cursor, statement, parameters, context, executemany):
+    if relatorio_atual.get() is not None:
+        conn.info.setdefault("perfil_inicio", []).append(time.perf_counter())
+
+
+def depoisSQL(conn, cursor, statement, parameters, context, executemany):
+    relatorio = relatorio_atual.get()
+    if relatorio is None or not conn.info.get("perfil_inicio"):
+        return
+    inicio = conn.info["perfil_inicio"].pop()
+    relatorio.sql.append({
+        "sql": statement,
+        "parametros": parameters if not executemany else f"{len(parameters)} linhas",
+        "ms": round((time.perf_counter() - inicio) * 1000, 3),
+        "executemany": executemany,
+    })
+
+
+def instalar():
+    global ativos
+    with lock:
+        ativos += 1
+        if ativos == 1:
+            event.listen(Engine, "before_cursor_execute", antesSQL)
+            event.listen(Engine, "after_cursor_execute", depoisSQL)
+
+
+def remover():
+    global ativos
+    with lock:
+        ativos -= 1
+        if ativos == 0:
+            event.remove(Engine, "before_cursor_execute", antesSQL)
+            event.remove(Engine, "after_cursor_execute", depoisSQL)
+
+
+def explicar(relatorio):
+    """Junta o EXPLAIN QUERY PLAN a cada instrução (depois do pedido terminar)"""
+    with engine.connect() as conn:
+        for instrucao in relatorio.sql:
+            if instrucao["executemany"]:
+                continue
+            try:
+                plano = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + instrucao["sql"], instrucao["parametros"])
+                instrucao["plano"] = [linha[-1] for linha in plano]
+            except Exception as e:
+                instrucao["plano"] = f"indisponível: {e}"
+        conn.rollback()
+    for instrucao in relatorio.sql:
+        if isinstance(instrucao["parametros"], tuple):
+            instrucao["parametros"] = [str(valor) for valor in instrucao["parametros"]]
+
+
+def ativar(relatorio):
+    try:
+        relatorio.profiler.enable()
+    except ValueError:
+        # outro profiler já ativo (ex: pedidos perfilados em simultâneo): só o SQL é registado
+        return False
+    relatorio.perfilado = True
+    return True
+
+
+def perfilar(endpoint):
+    """Envolve o endpoint para correr sob o cProfile do pedido, se existir"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def envolvido(*args, **kwargs):
+            relatorio = relatorio_atual.get()
+            if relatorio is None or not ativar(relatorio):
+                return await endpoint(*args, **kwargs)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                relatorio.profiler.disable()
+        return envolvido
+
+    @wraps(endpoint)
+    def envolvido(*args, **kwargs):
+        # endpoints síncronos correm numa thread do threadpool: o perfil é ativado nela
+        relatorio = relatorio_atual.get()
+        if relatorio is None or not ativar(relatorio):
+            return endpoint(*args, **kwargs)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            relatorio.profiler.disable()
+    return envolvido
+
+
+class RotaPerfilada(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, perfilar(endpoint), **kwargs)
+
+
+def pedidoPerfil(scope):
+    """Interruptor X-Profile: 1 ou ?profile=1, lido diretamente do scope ASGI"""
+    if (b"x-profile", b"1") in scope["headers"]:
+        return True
+    return b"profile=" in scope["query_string"] and ("profile", "1") in parse_qsl(scope["query_string"].decode("latin-1"))
+
+
+def autorizado(usuario):
+    """Só os contactos em PROFILE_ADMINS; sem a variável ninguém pode perfilar"""
+    return usuario is not None and usuario in PROFILE_ADMINS
+
+
+def administrador(request):
+    autorizacao = request.headers.get("Authorization", "")
+    if not resolver_usuario or not autorizacao.startswith("Bearer "):
+        return None
+    usuario = resolver_usuario(autorizacao[7:])
+    return usuario if autorizado(usuario) else None
+
+
+class ProfileMiddleware:
+    """
+    Middleware ASGI puro: sem o interruptor o pedido segue diretamente para a
+    aplicação, sem Request nem camada de BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not pedidoPerfil(scope):
+            return await self.app(scope, receive, send)
+        usuario = administrador(Request(scope))
+        if usuario is None:
+            resposta = JSONResponse(status_code=403, content={"detail": "Perfil só disponível para administradores"})
+            return await resposta(scope, receive, send)
+
+        relatorio = Relatorio(scope["method"], scope["path"], usuario)
+        retidas = []
+
+        async def enviar(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", relatorio.id.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # o fim do corpo só sai depois de o relatório estar guardado
+                retidas.append(message)
+                return
+            await send(message)
+
+        token = relatorio_atual.set(relatorio)
+        instalar()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            relatorio.ms = round((time.perf_counter() - inicio) * 1000, 3)
+            remover()
+            relatorio_atual.reset(token)
+        await run_in_threadpool(explicar, relatorio)
+        with lock:
+            relatorios[relatorio.id] = relatorio
+            while len(relatorios) > MAX_RELATORIOS:
+                relatorios.popitem(last=False)
+        for message in retidas:
+            await send(message)